@@ -0,0 +1,155 @@
+import math
+import multiprocessing
+from backend import big_int
+from perfect_power import is_perfect_power
+
+
+def find_r(n):
+    """Smallest r such that the multiplicative order of n modulo r exceeds log2(n)^2."""
+    limit = math.floor(math.log2(n) ** 2)
+    r = 2
+    while True:
+        if math.gcd(r, n) == 1:
+            x, k = n % r, 1
+            while x != 1 and k <= limit:
+                x = x * n % r
+                k += 1
+            if k > limit:
+                return r
+        r += 1
+
+
+def euler_phi(r):
+    """Euler's totient of r by trial factorization."""
+    result, m, p = r, r, 2
+    while p * p <= m:
+        if m % p == 0:
+            while m % p == 0:
+                m //= p
+            result -= result // p
+        p += 1
+    if m > 1:
+        result -= result // m
+    return result
+
+
+class PolynomialRing:
+    """
+    Arithmetic in Z_n[X] / (X^r - 1) on packed polynomials.
+
+    A polynomial is one big integer with a fixed-width slot of `width` bits
+    per coefficient (Kronecker substitution), and it stays packed between
+    operations: a square is a single big-int multiply, reduction mod X^r - 1
+    adds the high r slots onto the low r slots, and coefficients are reduced
+    mod n for all slots at once with a packed Barrett reduction (shifts, masks
+    and one multiply by a constant). Coefficients are kept below 4n rather than
+    fully reduced; unpack() reduces them exactly. With gmpy2 installed every
+    step runs in GMP.
+    """
+
+    def __init__(self, n, r):
+        self.n = n
+        self.r = r
+        bits = n.bit_length()
+        # Coefficients stay below 4n, so a product coefficient (a sum of r terms) is below 2^k.
+        self.k = k = (16 * r * n * n).bit_length()
+        self.shift = bits - 1
+        self.m = (1 << k) // n
+        # Room for the product coefficients and for the Barrett product (v >> shift) * m.
+        self.width = width = max(k, k - self.shift + self.m.bit_length()) + 1
+        self.poly_bits = r * width
+        self.full_mask = big_int((1 << self.poly_bits) - 1)
+        self.quotient_mask = self._repeat((1 << (width - self.shift)) - 1)
+        self.barrett_mask = self._repeat((1 << (width - (k - self.shift))) - 1)
+        self.m = big_int(self.m)
+
+    def _repeat(self, slot_value):
+        """slot_value in every one of the r slots."""
+        return big_int(slot_value * (((1 << self.poly_bits) - 1) // ((1 << self.width) - 1)))
+
+    def unpack(self, value):
+        """Coefficients of a packed polynomial, fully reduced mod n."""
+        mask = (1 << self.width) - 1
+        value = int(value)
+        return [(value >> (i * self.width) & mask) % self.n for i in range(self.r)]
+
+    def reduce(self, value):
+        """Bring every coefficient (each below 2^k) below 3n by packed Barrett reduction."""
+        q = (value >> self.shift) & self.quotient_mask
+        q = ((q * self.m) >> (self.k - self.shift)) & self.barrett_mask
+        return value - q * self.n
+
+    def square(self, value):
+        product = value * value
+        return self.reduce((product & self.full_mask) + (product >> self.poly_bits))
+
+    def multiply_linear(self, value, a):
+        """Multiply by (X + a); X rotates every coefficient up one slot."""
+        top = value >> (self.poly_bits - self.width)
+        rotated = ((value << self.width) & self.full_mask) | top
+        return self.reduce(rotated + a * value)
+
+    def power_linear(self, a, e):
+        """Compute (X + a)^e by left-to-right square and multiply."""
+        result = big_int(1)
+        for bit in bin(e)[2:]:
+            result = self.square(result)
+            if bit == "1":
+                result = self.multiply_linear(result, a)
+        return result
+
+
+def check_congruences(n, r, a_values):
+    """Return True if (X+a)^n == X^n + a mod (X^r - 1, n) for every a in a_values."""
+    ring = PolynomialRing(n, r)
+    for a in a_values:
+        expected = [0] * r
+        expected[n % r] = 1
+        expected[0] = (expected[0] + a) % n
+        if ring.unpack(ring.power_linear(a, n)) != expected:
+            return False
+    return True
+
+
+def _check_chunk(args):
+    return check_congruences(*args)
+
+
+def aks(n, workers=1, chunk_size=8, pool=None):
+    """
+    Agrawal-Kayal-Saxena deterministic primality test.
+    The polynomial congruence checks for the different values of a are
+    independent and are spread over `workers` processes when workers > 1.
+    A caller that tests many numbers can pass its own multiprocessing pool
+    instead; it is left running, and after a failed congruence it finishes
+    the remaining chunks in the background.
+    """
+    if n < 2:
+        return False
+    if n < 4:
+        return True
+    if is_perfect_power(n):
+        return False
+
+    r = find_r(n)
+    for a in range(2, min(r, n - 1) + 1):
+        if n % a == 0:
+            return False
+    if n <= r:
+        return True
+
+    limit = math.floor(math.sqrt(euler_phi(r)) * math.log2(n))
+    a_values = range(1, limit + 1)
+    if (pool is None and workers <= 1) or len(a_values) <= chunk_size:
+        return check_congruences(n, r, a_values)
+
+    chunks = [(n, r, a_values[i:i + chunk_size]) for i in range(0, len(a_values), chunk_size)]
+    if pool is not None:
+        return all(pool.imap_unordered(_check_chunk, chunks))
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        # Stop at the first failed congruence; the pool is terminated on exit.
+        return all(pool.imap_unordered(_check_chunk, chunks))
+    finally:
+        pool.terminate()
+        pool.join()
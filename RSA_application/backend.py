@@ -0,0 +1,72 @@
+"""
+Big-integer arithmetic backend.
+
+Uses gmpy2 (GMP) for modular exponentiation, strong probable-prime tests and
+modular inverses when it is installed, and plain Python integers otherwise.
+Both backends return ordinary Python ints and give identical results.
+"""
+import math
+import platform
+
+try:
+    import gmpy2
+except ImportError:  # gmpy2 is optional; everything works without it, just slower.
+    gmpy2 = None
+
+BACKEND = "gmpy2" if gmpy2 is not None else "python"
+
+
+def big_int(value):
+    """value as a GMP integer when gmpy2 is installed, so products and shifts of huge values run in GMP."""
+    if gmpy2 is not None:
+        return gmpy2.mpz(value)
+    return int(value)
+
+
+def powmod(base, exponent, modulus):
+    """base^exponent mod modulus."""
+    if gmpy2 is not None:
+        return int(gmpy2.powmod(base, exponent, modulus))
+    return pow(base, exponent, modulus)
+
+
+def invert(a, modulus):
+    """Modular inverse of a modulo modulus; raises ValueError if none exists."""
+    if gmpy2 is not None:
+        try:
+            return int(gmpy2.invert(a, modulus))
+        except ZeroDivisionError:
+            raise ValueError("Modular inverse does not exist") from None
+    try:
+        return pow(a, -1, modulus)
+    except ValueError:
+        raise ValueError("Modular inverse does not exist") from None
+
+
+def is_strong_prp(n, a):
+    """Strong probable-prime test of the odd number n > 3 to the base a (1 < a < n - 1)."""
+    if math.gcd(n, a) != 1:
+        return False
+    if gmpy2 is not None:
+        return bool(gmpy2.is_strong_prp(n, a))
+    r, d = 0, n - 1
+    while d % 2 == 0:
+        r += 1
+        d //= 2
+    x = pow(a, d, n)
+    if x in (1, n - 1):
+        return True
+    for _ in range(r - 1):
+        x = pow(x, 2, n)
+        if x == n - 1:
+            return True
+        elif x == 1:
+            return False
+    return False
+
+
+def backend_report():
+    """One-line description of the active arithmetic backend."""
+    if gmpy2 is not None:
+        return f"Arithmetic backend: gmpy2 {gmpy2.version()} ({gmpy2.mp_version()})"
+    return f"Arithmetic backend: pure Python ({platform.python_implementation()} {platform.python_version()})"
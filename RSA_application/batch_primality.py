@@ -0,0 +1,130 @@
+try:
+    import numpy as np
+except ImportError:  # Only is_prime_batch needs NumPy.
+    np = None
+
+# Miller-Rabin with these bases is exact for every n < 2^64 (Jim Sinclair's set).
+BATCH_MR_BASES = (2, 325, 9375, 28178, 450775, 9780504, 1795265022)
+BATCH_TRIAL_PRIMES = (3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61)
+BATCH_CHUNK = 1 << 20  # Elements processed together, to bound temporary memory.
+
+
+def _mul_wide(a, b):
+    """Full 128-bit products of uint64 arrays as (high, low) words, built from 32-bit limbs."""
+    mask = np.uint64(0xFFFFFFFF)
+    shift = np.uint64(32)
+    a0, a1 = a & mask, a >> shift
+    b0, b1 = b & mask, b >> shift
+    p00, p01, p10, p11 = a0 * b0, a0 * b1, a1 * b0, a1 * b1
+    middle = (p00 >> shift) + (p01 & mask) + (p10 & mask)
+    low = (p00 & mask) | (middle << shift)
+    high = p11 + (p01 >> shift) + (p10 >> shift) + (middle >> shift)
+    return high, low
+
+
+class _Montgomery:
+    """Vectorized Montgomery arithmetic with R = 2^64 for an array of odd moduli."""
+
+    def __init__(self, n):
+        self.n = n
+        # Newton iteration doubles the number of correct low bits of n^-1 each step.
+        inverse = n.copy()
+        for _ in range(5):
+            inverse *= np.uint64(2) - n * inverse
+        self.n_prime = np.uint64(0) - inverse
+        self.one = (np.uint64(0) - n) % n          # R mod n
+        self.minus_one = n - self.one
+        r_squared = self.one.copy()
+        for _ in range(64):
+            r_squared = self._add(r_squared, r_squared)
+        self.r_squared = r_squared
+
+    def _add(self, a, b):
+        """(a + b) mod n for a, b < n, without losing the carry out of 64 bits."""
+        total = a + b
+        wrap = (total < a) | (total >= self.n)
+        return np.where(wrap, total - self.n, total)
+
+    def multiply(self, a, b):
+        """Montgomery product a * b / R mod n."""
+        t_high, t_low = _mul_wide(a, b)
+        m = t_low * self.n_prime
+        m_high, _ = _mul_wide(m, self.n)
+        # t_low + m*n_low is 0 mod 2^64; it carries exactly when t_low is non-zero.
+        carry = (t_low != 0).astype(np.uint64)
+        total = t_high + m_high
+        overflow = total < t_high
+        total_with_carry = total + carry
+        overflow |= total_with_carry < total
+        return np.where(overflow | (total_with_carry >= self.n), total_with_carry - self.n, total_with_carry)
+
+    def to_montgomery(self, a):
+        return self.multiply(a % self.n, self.r_squared)
+
+    def power(self, base, exponent):
+        """base^exponent in Montgomery form, with a per-element exponent."""
+        result = self.one.copy()
+        one = np.uint64(1)
+        for bit in range(int(exponent.max()).bit_length() - 1, -1, -1):
+            result = self.multiply(result, result)
+            use = ((exponent >> np.uint64(bit)) & one).astype(bool)
+            if use.any():
+                result = np.where(use, self.multiply(result, base), result)
+        return result
+
+
+def _strong_probable_prime(n, base):
+    """Boolean mask: which odd n > 2 pass a strong test to the per-element bases."""
+    mont = _Montgomery(n)
+    d = n - np.uint64(1)
+    s = np.zeros(n.shape, dtype=np.int64)
+    even = (d & np.uint64(1)) == 0
+    while even.any():
+        d = np.where(even, d >> np.uint64(1), d)
+        s += even
+        even = (d & np.uint64(1)) == 0
+    x = mont.power(mont.to_montgomery(base), d)
+    passed = (x == mont.one) | (x == mont.minus_one)
+    for r in range(1, int(s.max())):
+        x = mont.multiply(x, x)
+        passed |= (r < s) & (x == mont.minus_one)
+    return passed
+
+
+def _is_prime_chunk(n):
+    result = np.zeros(n.shape, dtype=bool)
+    result |= n == np.uint64(2)
+    candidates = (n > np.uint64(2)) & ((n & np.uint64(1)) == 1)
+    for p in BATCH_TRIAL_PRIMES:
+        result |= n == np.uint64(p)
+        candidates &= (n % np.uint64(p)) != 0
+    # Anything left is odd, > 61 and free of small factors; survivors go base by base.
+    index = np.flatnonzero(candidates)
+    values = n[index]
+    for base in BATCH_MR_BASES:
+        if not values.size:
+            break
+        reduced = np.uint64(base) % values
+        # A base that is 0 modulo n says nothing about n.
+        keep = reduced == 0
+        test = ~keep
+        if test.any():
+            keep[test] = _strong_probable_prime(values[test], reduced[test])
+        index, values = index[keep], values[keep]
+    result[index] = True
+    return result
+
+
+def is_prime_batch(values):
+    """
+    Deterministic primality of every element of an array of integers below 2^64.
+    Runs Miller-Rabin with a fixed 7-base set over the whole array at once using
+    vectorized Montgomery multiplication; returns a boolean mask.
+    """
+    if np is None:
+        raise ImportError("is_prime_batch requires NumPy.")
+    n = np.asarray(values, dtype=np.uint64).ravel()
+    result = np.empty(n.shape, dtype=bool)
+    for start in range(0, n.size, BATCH_CHUNK):
+        result[start:start + BATCH_CHUNK] = _is_prime_chunk(n[start:start + BATCH_CHUNK])
+    return result.reshape(np.shape(values))
@@ -0,0 +1,53 @@
+"""
+Helpers shared by the benchmark runners (performance_testing.py and
+time_comparisons/main.py): worker process groups, machine metadata and the
+one-line console summary of a measured case.
+"""
+import os
+import platform
+import signal
+import subprocess
+import time
+from backend import backend_report
+
+
+def isolate():
+    """Put a worker in its own process group, so stopping it also stops any pool it started."""
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+
+def kill(process):
+    """Stop a worker together with its process group."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError):  # No process groups (Windows), or it already exited.
+        process.terminate()
+    process.join()
+
+
+def machine_metadata(**extra):
+    """Where and with what the results were measured, plus any run settings given as keywords."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=5, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": f"{platform.python_implementation()} {platform.python_version()}",
+        "backend": backend_report(),
+        "commit": commit or None,
+        **extra,
+    }
+
+
+def format_result(label, status, error=None, measured=None):
+    """One console line for a case: the measured figures, or the status (and error) when there are none."""
+    if measured is None:
+        return f"{label}{status}" + (f" ({error})" if error else "")
+    return f"{label}{measured}" + (f"  [{status}]" if status != "ok" else "")
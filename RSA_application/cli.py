@@ -0,0 +1,264 @@
+"""
+Command-line interface for headless and batch use.
+
+    python cli.py register alice --bits 1024 --key-out alice.key
+    python cli.py encrypt --user alice reports/ "logs/**/*.txt" --workers 8
+    python cli.py decrypt --key alice.key reports/ --workers 8
+    python cli.py bench --modulus-bits 1024 2048 --size 8
+
+Paths may be files, directories (walked recursively) or glob patterns. Keys
+are loaded once per run and handed to each worker process once, not per file.
+With several files, each worker process handles whole files; a single file is
+split into RSA block batches across the workers instead.
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import sys
+import time
+from backend import backend_report
+from container import (ENC_SUFFIX, MODE_BLOCKS, MODE_ENVELOPE, decrypt_file, decrypt_stream, decrypted_path,
+                       encrypt_file, encrypt_stream, encrypted_path)
+from key_context import load_key_file, save_key_file
+from primality import PrimalityTester
+from prime_pool import DEFAULT_POOL_DIR, LOW_WATER, PrimePool
+from rsa import KEYGEN_ERROR_BOUND, SCARCE_PRIME_BITS, RSAKeyGenerator
+from user_store import LEGACY_USERS_FILE, USERS_DB, UserStore
+
+
+def expand_paths(patterns, suffix=None):
+    """
+    Files named by the given paths, directories and glob patterns, in order and
+    without duplicates. Files found by walking a directory are kept only if
+    they end with suffix (when given); explicitly named files are always kept.
+    """
+    files = []
+    seen = set()
+
+    def add(path):
+        if path not in seen:
+            seen.add(path)
+            files.append(path)
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern!r}.")
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, names in os.walk(match):
+                    dirs.sort()
+                    for name in sorted(names):
+                        if suffix is None or name.endswith(suffix):
+                            add(os.path.join(root, name))
+            elif os.path.exists(match):
+                add(match)
+            else:
+                raise FileNotFoundError(f"{match} does not exist.")
+    return files
+
+
+# Per-process state for file workers, set once by _init_worker.
+_worker_job = None
+
+
+def _init_worker(job):
+    global _worker_job
+    _worker_job = job
+
+
+def _process_file(task):
+    """Encrypt or decrypt one file; returns (source, output, bytes, seconds, error)."""
+    src, dst = task
+    action, key, mode, block_workers = _worker_job
+    start = time.perf_counter()
+    try:
+        if action == "encrypt":
+            encrypt_file(src, dst, key, mode, workers=block_workers)
+        else:
+            decrypt_file(src, dst, key, workers=block_workers)
+    except Exception as e:
+        return src, dst, 0, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return src, dst, os.path.getsize(src), time.perf_counter() - start, None
+
+
+def _report(results):
+    """Print one line per finished file as results arrive, passing them through."""
+    for src, dst, size, seconds, error in results:
+        if error is None:
+            print(f"ok    {src} -> {dst} ({size} bytes, {seconds:.2f} s)")
+        else:
+            print(f"FAIL  {src}: {error}", file=sys.stderr)
+        yield src, dst, size, seconds, error
+
+
+def run_files(action, key, tasks, workers, mode=MODE_BLOCKS):
+    """Encrypt or decrypt (source, output) pairs with `workers` processes; returns the failure count."""
+    if len(tasks) == 1:
+        pool_size, block_workers = 1, workers
+    else:
+        pool_size, block_workers = min(workers, len(tasks)), 1
+    job = (action, key, mode, block_workers)
+    start = time.perf_counter()
+    if pool_size > 1:
+        pool = multiprocessing.Pool(pool_size, initializer=_init_worker, initargs=(job,))
+        try:
+            results = list(_report(pool.imap_unordered(_process_file, tasks)))
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        _init_worker(job)
+        results = list(_report(map(_process_file, tasks)))
+    elapsed = time.perf_counter() - start
+    failures = sum(error is not None for *_, error in results)
+    total = sum(size for _, _, size, _, _ in results) / (1 << 20)
+    rate = f", {total / elapsed:.1f} MB/s" if elapsed > 0 else ""
+    print(f"{action}: {len(results) - failures} of {len(results)} files done, "
+          f"{total:.1f} MB in {elapsed:.2f} s{rate}")
+    return failures
+
+
+def _pending(tasks, force):
+    """Drop tasks whose output already exists, unless force is set."""
+    if force:
+        return tasks
+    kept = []
+    for src, dst in tasks:
+        if os.path.exists(dst):
+            print(f"skip  {src}: {dst} exists (use --force to overwrite)")
+        else:
+            kept.append((src, dst))
+    return kept
+
+
+def cmd_register(args):
+    with UserStore(args.db, legacy_path=LEGACY_USERS_FILE) as users:
+        if args.username in users:
+            print(f"User '{args.username}' already exists.", file=sys.stderr)
+            return 1
+        key_out = args.key_out or f"{args.username}.key"
+        if os.path.exists(key_out) and not args.force:
+            print(f"{key_out} exists (use --force to overwrite).", file=sys.stderr)
+            return 1
+        # low_water=0: no background refill, which would die with this process.
+        # The pool is topped up below, once the user is registered.
+        pool = PrimePool(args.pool_dir, tester=PrimalityTester(error_bound=KEYGEN_ERROR_BOUND), low_water=0)
+        start = time.perf_counter()
+        generator = RSAKeyGenerator(bit_length=args.bits, error_bound=KEYGEN_ERROR_BOUND,
+                                    workers=args.workers, primes=args.primes, pool=pool)
+        public_key, private_key = generator.generate_keys()
+        elapsed = time.perf_counter() - start
+        save_key_file(key_out, private_key)
+        users.add(args.username, public_key)
+    print(f"Registered '{args.username}' ({public_key[1].bit_length()}-bit modulus, {elapsed:.2f} s); "
+          f"private key saved to {key_out}")
+    if not args.no_refill:
+        for bits in sorted(set(generator.prime_lengths())):
+            if bits >= SCARCE_PRIME_BITS and pool.available(bits) < LOW_WATER:
+                print(f"Topping up the prime pool with {bits}-bit primes (skip with --no-refill)...")
+                pool.fill(bits)
+    return 0
+
+
+def cmd_encrypt(args):
+    with UserStore(args.db, legacy_path=LEGACY_USERS_FILE) as users:
+        try:
+            public_key = users.public_key(args.user)
+        except KeyError:
+            print(f"Unknown user '{args.user}'.", file=sys.stderr)
+            return 1
+    files = [path for path in expand_paths(args.paths) if not path.endswith(ENC_SUFFIX)]
+    tasks = _pending([(path, encrypted_path(path)) for path in files], args.force)
+    mode = MODE_BLOCKS if args.blocks else MODE_ENVELOPE
+    return 1 if run_files("encrypt", public_key, tasks, args.workers, mode) else 0
+
+
+def cmd_decrypt(args):
+    private_key = load_key_file(args.key)
+    files = expand_paths(args.paths, suffix=ENC_SUFFIX)
+    tasks = _pending([(path, decrypted_path(path)) for path in files], args.force)
+    return 1 if run_files("decrypt", private_key, tasks, args.workers) else 0
+
+
+def _time(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def cmd_bench(args):
+    print(backend_report())
+    data = os.urandom(args.size << 20)
+    print(f"{'bits':>6} {'keygen s':>9} {'mode':>9} {'enc MB/s':>9} {'dec MB/s':>9}")
+    for bits in args.modulus_bits:
+        generator = RSAKeyGenerator(bit_length=bits // 2, error_bound=KEYGEN_ERROR_BOUND, workers=args.workers)
+        keygen_time, (public_key, private_key) = _time(generator.generate_keys)
+        for name, mode in (("blocks", MODE_BLOCKS), ("envelope", MODE_ENVELOPE)):
+            encrypted = io.BytesIO()
+            enc_time, _ = _time(lambda: encrypt_stream(io.BytesIO(data), encrypted, public_key, mode,
+                                                       workers=args.workers))
+            encrypted.seek(0)
+            decrypted = io.BytesIO()
+            dec_time, _ = _time(lambda: decrypt_stream(encrypted, decrypted, private_key, workers=args.workers))
+            if decrypted.getvalue() != data:
+                raise RuntimeError(f"Round trip failed for {bits}-bit {name} mode.")
+            print(f"{bits:>6} {keygen_time:>9.3f} {name:>9} {args.size / enc_time:>9.2f} {args.size / dec_time:>9.2f}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Multi-user RSA file encryption, without the GUI.")
+    parser.add_argument("--db", default=USERS_DB, help="user database (default: %(default)s)")
+    workers = dict(type=int, default=os.cpu_count() or 1,
+                   help="worker processes (default: one per core, %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("register", help="generate a key pair and register a user")
+    p.add_argument("username")
+    p.add_argument("--bits", type=int, default=1024, help="bit length of each prime (default: %(default)s)")
+    p.add_argument("--primes", type=int, default=2, help="primes in the modulus (default: %(default)s)")
+    p.add_argument("--key-out", help="private key file (default: <username>.key)")
+    p.add_argument("--pool-dir", default=DEFAULT_POOL_DIR, help="prime pool directory (default: %(default)s)")
+    p.add_argument("--no-refill", action="store_true", help="do not top the prime pool up afterwards")
+    p.add_argument("--force", action="store_true", help="overwrite an existing key file")
+    p.add_argument("--workers", **workers)
+    p.set_defaults(func=cmd_register)
+
+    p = sub.add_parser("encrypt", help="encrypt files for a registered user")
+    p.add_argument("paths", nargs="+", help="files, directories or glob patterns")
+    p.add_argument("--user", required=True)
+    p.add_argument("--blocks", action="store_true", help="plain RSA blocks instead of envelope mode")
+    p.add_argument("--force", action="store_true", help="overwrite existing .enc files")
+    p.add_argument("--workers", **workers)
+    p.set_defaults(func=cmd_encrypt)
+
+    p = sub.add_parser("decrypt", help="decrypt .enc files with a private key file")
+    p.add_argument("paths", nargs="+", help="files, directories (their .enc files) or glob patterns")
+    p.add_argument("--key", required=True, help="private key file")
+    p.add_argument("--force", action="store_true", help="overwrite existing .dec files")
+    p.add_argument("--workers", **workers)
+    p.set_defaults(func=cmd_decrypt)
+
+    p = sub.add_parser("bench", help="time key generation and encryption throughput")
+    p.add_argument("--modulus-bits", type=int, nargs="+", default=[1024, 2048],
+                   help="modulus sizes to measure (default: %(default)s)")
+    p.add_argument("--size", type=int, default=4, help="MiB of data per measurement (default: %(default)s)")
+    p.add_argument("--workers", **workers)
+    p.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
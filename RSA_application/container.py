@@ -0,0 +1,421 @@
+"""
+Versioned binary .enc container.
+
+Layout (all integers big-endian):
+
+    magic "RSAC" | version (u8) | mode (u8) | modulus bytes (u16)
+    | block count (u64) | plaintext length (u64)
+    | block count fixed-width RSA blocks, modulus-bytes wide each
+
+MODE_BLOCKS stores the whole plaintext as RSA blocks. MODE_ENVELOPE stores the
+RSA-wrapped file key as the blocks, followed by the nonce, the keystream
+ciphertext (plaintext length bytes) and the HMAC tag. The tag covers the
+ciphertext followed by the header, wrapped key and nonce, so a streaming writer
+can still fix up the header once the length is known.
+"""
+import hmac
+import io
+import mmap
+import os
+import struct
+import tempfile
+from collections import namedtuple
+from contextlib import nullcontext
+from envelope import (FILE_KEY_SIZE, KEYSTREAM_CHUNK, NONCE_SIZE, TAG_SIZE, apply_keystream,
+                      derive_keys, generate_file_key, generate_nonce, new_mac)
+from key_context import KeyContext
+from parallel_blocks import IN_FLIGHT_PER_WORKER, BlockPool
+from rsa import Cancelled, encrypt_data, decrypt_data
+
+CONTAINER_MAGIC = b"RSAC"
+CONTAINER_VERSION = 1
+MODE_BLOCKS = 0
+MODE_ENVELOPE = 1
+STREAM_BUFFER = 1 << 20  # Plaintext bytes held in memory by the streaming API.
+ENC_SUFFIX = ".enc"
+DEC_SUFFIX = ".dec"
+
+_HEADER = struct.Struct(">4sBBHQQ")
+HEADER_SIZE = _HEADER.size
+
+ContainerHeader = namedtuple("ContainerHeader", "version mode modulus_bytes block_count length")
+
+
+def modulus_bytes(key):
+    """Width in bytes of one ciphertext block for the key's modulus."""
+    return KeyContext(key).modulus_bytes
+
+
+def pack_header(mode, width, block_count, length):
+    return _HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, mode, width, block_count, length)
+
+
+def is_container(buffer):
+    return bytes(buffer[:len(CONTAINER_MAGIC)]) == CONTAINER_MAGIC
+
+
+def read_header(buffer):
+    """Parse and validate the container header at the start of buffer."""
+    if len(buffer) < HEADER_SIZE or not is_container(buffer):
+        raise ValueError("Not an encrypted container file.")
+    magic, version, mode, width, block_count, length = _HEADER.unpack_from(buffer)
+    if version != CONTAINER_VERSION:
+        raise ValueError(f"Unsupported container version {version}.")
+    if mode not in (MODE_BLOCKS, MODE_ENVELOPE):
+        raise ValueError(f"Unknown container mode {mode}.")
+    return ContainerHeader(version, mode, width, block_count, length)
+
+
+def _check_key(header, private_key):
+    """Refuse a key whose block width differs from the container's, before any output is written."""
+    if header.modulus_bytes != private_key.modulus_bytes:
+        raise ValueError("Container was encrypted for a different key.")
+
+
+def pack_blocks(blocks, width):
+    return b"".join(c.to_bytes(width, "big") for c in blocks)
+
+
+def iter_blocks(buffer, width, count, offset=HEADER_SIZE):
+    """Decode fixed-width blocks straight out of buffer (e.g. an mmap) without copying."""
+    view = memoryview(buffer)
+    end = offset + width * count
+    if len(view) < end:
+        raise ValueError("Container is truncated.")
+    for start in range(offset, end, width):
+        yield int.from_bytes(view[start:start + width], "big")
+
+
+def _read_full(reader, size):
+    """Read size bytes, returning fewer only at the end of the stream."""
+    parts = []
+    while size:
+        part = reader.read(size)
+        if not part:
+            break
+        parts.append(part)
+        size -= len(part)
+    return b"".join(parts)
+
+
+def _read_exact(reader, size):
+    data = _read_full(reader, size)
+    if len(data) != size:
+        raise ValueError("Container is truncated.")
+    return data
+
+
+def _iter_chunks(reader, length, size=KEYSTREAM_CHUNK):
+    """Yield exactly `length` bytes from reader in pieces of at most `size`."""
+    while length:
+        chunk = _read_exact(reader, min(size, length))
+        length -= len(chunk)
+        yield chunk
+
+
+def _remaining_length(reader):
+    """Bytes left to read when reader is a regular file, else None."""
+    try:
+        return os.fstat(reader.fileno()).st_size - reader.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _block_pool(workers):
+    """A BlockPool for one call, or the caller's shared BlockPool, which stays open."""
+    if isinstance(workers, BlockPool):
+        return nullcontext(workers)
+    return BlockPool(workers)
+
+
+def _blocks_per_batch(pool, buffer_size, block_bytes):
+    """Blocks per batch: small enough for timely progress, and for the in-flight batches to fit the buffer."""
+    return max(1, min(pool.batch_blocks, buffer_size // (block_bytes * pool.workers * IN_FLIGHT_PER_WORKER)))
+
+
+def _step(cancel, on_progress, done, total):
+    """Between batches: stop if cancelled, else report bytes done out of total (None if unknown)."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled("Operation cancelled.")
+    if on_progress:
+        on_progress(done, total)
+
+
+def _check_tag(mac, preamble, tag):
+    """The tag covers the ciphertext followed by the final header, wrapped key and nonce."""
+    mac.update(preamble)
+    if not hmac.compare_digest(mac.digest(), bytes(tag)):
+        raise ValueError("Container failed authentication; wrong private key or corrupted file.")
+
+
+def encrypt_stream(reader, writer, public_key, mode=MODE_BLOCKS, length=None, buffer_size=STREAM_BUFFER,
+                   workers=1, cancel=None, on_progress=None):
+    """
+    Encrypt everything read from `reader` into a container written to `writer`,
+    holding about buffer_size bytes of plaintext in memory at a time.
+    The header records the plaintext length: it comes from `length`, from the
+    size of a regular-file reader, or is patched in at the end when the writer
+    is seekable. With workers > 1, RSA blocks are encrypted by a process pool;
+    workers may also be a shared BlockPool, which is left open.
+    After every batch on_progress(bytes_done, length) is called, and the
+    operation stops with Cancelled once the `cancel` event is set.
+    Returns the number of plaintext bytes encrypted.
+    """
+    if mode not in (MODE_BLOCKS, MODE_ENVELOPE):
+        raise ValueError(f"Unknown container mode {mode}.")
+    if length is None:
+        length = _remaining_length(reader)
+    if length is None and not writer.seekable():
+        raise ValueError("Plaintext length is unknown and the output is not seekable.")
+    public_key = KeyContext(public_key)  # Sizes computed once, not per batch.
+    width = public_key.modulus_bytes
+    header_position = writer.tell() if writer.seekable() else None
+    total = 0
+
+    if mode == MODE_BLOCKS:
+        chunk_size = public_key.chunk_size
+        writer.write(pack_header(mode, width, -(-(length or 0) // chunk_size), length or 0))
+
+        def batches(step):
+            nonlocal total
+            for data in iter(lambda: _read_full(reader, step), b""):
+                total += len(data)
+                yield data
+
+        with _block_pool(workers) as pool:
+            step = _blocks_per_batch(pool, buffer_size, chunk_size) * chunk_size
+            for blocks in pool.encrypt_batches(batches(step), public_key):
+                writer.write(pack_blocks(blocks, width))
+                _step(cancel, on_progress, total, length)
+        header = pack_header(mode, width, -(-total // chunk_size), total)
+        tail = b""
+    else:
+        file_key = generate_file_key()
+        enc_key, mac_key = derive_keys(file_key)
+        nonce = generate_nonce()
+        wrapped = pack_blocks(encrypt_data(file_key, public_key), width)
+        count = len(wrapped) // width
+        writer.write(pack_header(mode, width, count, length or 0) + wrapped + nonce)
+        mac = new_mac(mac_key, b"")
+        for index, data in enumerate(iter(lambda: _read_full(reader, KEYSTREAM_CHUNK), b"")):
+            ciphertext = apply_keystream(enc_key, nonce, data, start_chunk=index)
+            mac.update(ciphertext)
+            writer.write(ciphertext)
+            total += len(data)
+            _step(cancel, on_progress, total, length)
+        header = pack_header(mode, width, count, total)
+        mac.update(header + wrapped + nonce)
+        tail = mac.digest()
+
+    writer.write(tail)
+    if total != length:
+        if header_position is None:
+            raise ValueError("Input length changed while encrypting.")
+        end = writer.tell()
+        writer.seek(header_position)
+        writer.write(header)
+        writer.seek(end)
+    return total
+
+
+def decrypt_stream(reader, writer, private_key, buffer_size=STREAM_BUFFER, workers=1, cancel=None,
+                   on_progress=None):
+    """
+    Decrypt a container read from `reader` and write the plaintext to `writer`,
+    holding about buffer_size bytes in memory at a time.
+    Envelope containers are authenticated before any plaintext is written when
+    the reader is seekable; otherwise the tag is checked at the end, and on a
+    ValueError the caller must discard what was written. Workers, progress
+    and cancellation work as in encrypt_stream; the verification pass counts
+    as work too.
+    Returns the number of plaintext bytes written.
+    """
+    private_key = KeyContext(private_key)
+    header_bytes = _read_exact(reader, HEADER_SIZE)
+    header = read_header(header_bytes)
+    _check_key(header, private_key)
+    width, count, length = header.modulus_bytes, header.block_count, header.length
+
+    if header.mode == MODE_BLOCKS:
+        chunk_size = private_key.chunk_size
+
+        def batches(per_read):
+            remaining, left = length, count
+            while left:
+                k = min(per_read, left)
+                data = _read_exact(reader, k * width)
+                part = min(remaining, k * chunk_size)
+                yield list(iter_blocks(data, width, k, offset=0)), part
+                remaining -= part
+                left -= k
+
+        with _block_pool(workers) as pool:
+            per_read = _blocks_per_batch(pool, buffer_size, width)
+            done = 0
+            for plaintext in pool.decrypt_batches(batches(per_read), private_key):
+                writer.write(plaintext)
+                done += len(plaintext)
+                _step(cancel, on_progress, done, length)
+        return length
+
+    wrapped = _read_exact(reader, width * count)
+    nonce = _read_exact(reader, NONCE_SIZE)
+    preamble = header_bytes + wrapped + nonce
+    file_key = _unwrap_file_key(list(iter_blocks(wrapped, width, count, offset=0)), private_key)
+    enc_key, mac_key = derive_keys(file_key)
+    mac = new_mac(mac_key, b"")
+    if reader.seekable():
+        body = reader.tell()
+        done = 0
+        for chunk in _iter_chunks(reader, length):
+            mac.update(chunk)
+            done += len(chunk)
+            _step(cancel, on_progress, done, 2 * length)
+        _check_tag(mac, preamble, _read_exact(reader, TAG_SIZE))
+        reader.seek(body)
+        for index, chunk in enumerate(_iter_chunks(reader, length)):
+            writer.write(apply_keystream(enc_key, nonce, chunk, start_chunk=index))
+            done += len(chunk)
+            _step(cancel, on_progress, done, 2 * length)
+    else:
+        done = 0
+        for index, chunk in enumerate(_iter_chunks(reader, length)):
+            mac.update(chunk)
+            writer.write(apply_keystream(enc_key, nonce, chunk, start_chunk=index))
+            done += len(chunk)
+            _step(cancel, on_progress, done, length)
+        _check_tag(mac, preamble, _read_exact(reader, TAG_SIZE))
+    return length
+
+
+def encrypt_container(data, public_key, mode=MODE_BLOCKS):
+    """Encrypt data into a complete container (bytes)."""
+    out = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), out, public_key, mode, length=len(data))
+    return out.getvalue()
+
+
+def _unwrap_file_key(wrapped, private_key):
+    try:
+        return decrypt_data(wrapped, private_key, length=FILE_KEY_SIZE)
+    except OverflowError:
+        raise ValueError("Failed to unwrap the file key; wrong private key?") from None
+
+
+def decrypt_container(buffer, private_key):
+    """
+    Decrypt a container held in any buffer (bytes, bytearray, mmap).
+    Raises ValueError for malformed containers or failed authentication, and
+    OverflowError when RSA blocks do not fit (typically a wrong private key).
+    """
+    header = read_header(buffer)
+    private_key = KeyContext(private_key)
+    _check_key(header, private_key)
+    width, count = header.modulus_bytes, header.block_count
+    blocks = iter_blocks(buffer, width, count)
+    if header.mode == MODE_BLOCKS:
+        return decrypt_data(blocks, private_key, length=header.length)
+
+    view = memoryview(buffer)
+    file_key = _unwrap_file_key(list(blocks), private_key)
+    enc_key, mac_key = derive_keys(file_key)
+    offset = HEADER_SIZE + width * count
+    nonce = view[offset:offset + NONCE_SIZE]
+    ciphertext = view[offset + NONCE_SIZE:offset + NONCE_SIZE + header.length]
+    tag = view[offset + NONCE_SIZE + header.length:offset + NONCE_SIZE + header.length + TAG_SIZE]
+    if len(ciphertext) != header.length or len(tag) != TAG_SIZE:
+        raise ValueError("Container is truncated.")
+    _check_tag(new_mac(mac_key, ciphertext), view[:offset + NONCE_SIZE], tag)
+    return apply_keystream(enc_key, bytes(nonce), ciphertext)
+
+
+def is_container_file(path):
+    with open(path, "rb") as f:
+        return is_container(f.read(len(CONTAINER_MAGIC)))
+
+
+def decrypt_container_file(path, private_key):
+    """Decrypt a container file by memory-mapping it rather than reading it into memory."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return decrypt_container(mapped, private_key)
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # An in-flight exception still references a view; unmapped when collected.
+
+
+def _decrypt_legacy_stream(reader, writer, private_key, buffer_size=STREAM_BUFFER, cancel=None, on_progress=None):
+    """Decrypt the legacy text format (one decimal ciphertext block per line)."""
+    private_key = KeyContext(private_key)
+    lines_per_batch = max(1, buffer_size // max(1, private_key.chunk_size))
+    batch = []
+    done = 0
+    for line in reader:
+        if line.strip():
+            batch.append(int(line))
+        if len(batch) == lines_per_batch:
+            done += writer.write(decrypt_data(batch, private_key))
+            _step(cancel, on_progress, done, None)
+            batch = []
+    if batch:
+        writer.write(decrypt_data(batch, private_key))
+
+
+def encrypted_path(path):
+    """Output name for an encrypted file: a.txt -> a.txt.enc."""
+    return path + ENC_SUFFIX
+
+
+def decrypted_path(path):
+    """Output name for a decrypted file: a.txt.enc -> a.txt.dec."""
+    if path.endswith(ENC_SUFFIX):
+        return path[:-len(ENC_SUFFIX)] + DEC_SUFFIX
+    return path + DEC_SUFFIX
+
+
+def _transform_file(src_path, dst_path, job):
+    """
+    Run job(src, dst) from src_path into a temporary file next to dst_path,
+    then move it over dst_path. On failure or cancellation only the temporary
+    file is removed, so a file that already existed at dst_path is never lost.
+    """
+    if os.path.exists(dst_path) and os.path.samefile(src_path, dst_path):
+        raise ValueError(f"Refusing to overwrite the input file {src_path}.")
+    directory = os.path.dirname(os.path.abspath(dst_path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(dst_path) + ".", suffix=".part", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as dst, open(src_path, "rb") as src:
+            result = job(src, dst)
+        os.replace(temp_path, dst_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return result
+
+
+def encrypt_file(src_path, dst_path, public_key, mode=MODE_BLOCKS, workers=1, cancel=None, on_progress=None):
+    """
+    Stream-encrypt the file at src_path into a container at dst_path.
+    dst_path is only replaced once encryption has finished.
+    """
+    return _transform_file(src_path, dst_path,
+                           lambda src, dst: encrypt_stream(src, dst, public_key, mode, workers=workers,
+                                                           cancel=cancel, on_progress=on_progress))
+
+
+def decrypt_file(src_path, dst_path, private_key, workers=1, cancel=None, on_progress=None):
+    """
+    Stream-decrypt a container (or a legacy text .enc file) at src_path into
+    dst_path, which is only replaced once decryption has finished.
+    """
+    if is_container_file(src_path):
+        return _transform_file(src_path, dst_path,
+                               lambda src, dst: decrypt_stream(src, dst, private_key, workers=workers,
+                                                               cancel=cancel, on_progress=on_progress))
+    return _transform_file(src_path, dst_path,
+                           lambda src, dst: _decrypt_legacy_stream(src, dst, private_key, cancel=cancel,
+                                                                   on_progress=on_progress))
@@ -0,0 +1,55 @@
+import hashlib
+import hmac
+import os
+
+try:
+    import numpy as np
+except ImportError:  # XOR falls back to big-int arithmetic.
+    np = None
+
+FILE_KEY_SIZE = 32
+NONCE_SIZE = 16
+TAG_SIZE = 32
+KEYSTREAM_CHUNK = 1 << 20
+
+
+def derive_keys(file_key):
+    """Independent keystream and MAC keys from the per-file key."""
+    enc_key = hashlib.blake2b(file_key, digest_size=32, person=b"rsa-env-stream").digest()
+    mac_key = hashlib.blake2b(file_key, digest_size=32, person=b"rsa-env-mac").digest()
+    return enc_key, mac_key
+
+
+def _xor(data, keystream):
+    if np is not None and len(data) % 8 == 0:
+        return (np.frombuffer(data, dtype=np.uint64) ^ np.frombuffer(keystream, dtype=np.uint64)).tobytes()
+    return (int.from_bytes(data, "little") ^ int.from_bytes(keystream, "little")).to_bytes(len(data), "little")
+
+
+def apply_keystream(enc_key, nonce, data, start_chunk=0):
+    """
+    XOR data with a SHAKE-128 keystream. Each KEYSTREAM_CHUNK-sized piece uses
+    its own XOF instance keyed by (key, nonce, chunk index), so pieces can be
+    processed independently. Encryption and decryption are the same operation.
+    """
+    view = memoryview(data)
+    pieces = []
+    for index, offset in enumerate(range(0, len(view), KEYSTREAM_CHUNK), start_chunk):
+        chunk = view[offset:offset + KEYSTREAM_CHUNK]
+        keystream = hashlib.shake_128(enc_key + nonce + index.to_bytes(8, "big")).digest(len(chunk))
+        pieces.append(_xor(chunk, keystream))
+    return b"".join(pieces)
+
+
+def generate_file_key():
+    """Random per-file key for envelope mode."""
+    return os.urandom(FILE_KEY_SIZE)
+
+
+def generate_nonce():
+    return os.urandom(NONCE_SIZE)
+
+
+def new_mac(mac_key, associated_data):
+    """HMAC-SHA256 instance already covering the given associated data."""
+    return hmac.new(mac_key, associated_data, hashlib.sha256)
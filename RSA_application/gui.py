@@ -1,16 +1,34 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from rsa import RSAKeyGenerator, encrypt_data, decrypt_data
+from rsa import RSAKeyGenerator
+from container import (MODE_BLOCKS, MODE_ENVELOPE, decrypt_file, decrypted_path, encrypt_file, encrypted_path,
+                       modulus_bytes)
+from gui_tasks import TaskRunner, keygen_status, transfer_status
 
 class EncryptionApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Secure File Encryption with RSA")
-        self.geometry("500x300")
+        self.geometry("500x380")
         self.rsa_generator = RSAKeyGenerator(bit_length=16)  # Default bit length for demo
         self.public_key = None
         self.private_key = None
         self.create_widgets()
+        self.tasks = TaskRunner(self, cancel_button=self.cancel_button)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def close(self):
+        self.tasks.shutdown()
+        self.destroy()
+
+    def busy(self):
+        if self.tasks.busy:
+            messagebox.showerror("Busy", "Another operation is still running.")
+            return True
+        return False
+
+    def show_status(self, text):
+        self.status_label.config(text=text)
 
     def create_widgets(self):
         self.bit_length_label = tk.Label(
@@ -26,6 +44,12 @@ class EncryptionApp(tk.Tk):
         )
         self.gen_keys_button.pack(pady=5)
 
+        self.envelope_var = tk.BooleanVar(self, value=True)
+        self.envelope_check = tk.Checkbutton(
+            self, text="Envelope mode (fast, for large files)", variable=self.envelope_var
+        )
+        self.envelope_check.pack(pady=5)
+
         self.enc_button = tk.Button(
             self, text="Encrypt File", command=self.encrypt_file
         )
@@ -36,43 +60,69 @@ class EncryptionApp(tk.Tk):
         )
         self.dec_button.pack(pady=5)
 
+        self.cancel_button = tk.Button(
+            self, text="Cancel", state="disabled", command=lambda: self.tasks.cancel()
+        )
+        self.cancel_button.pack(pady=5)
+
         self.status_label = tk.Label(self, text="Status: Idle", justify="left")
         self.status_label.pack(pady=10)
 
     def generate_keys(self):
+        if self.busy():
+            return
         try:
-            bit_length = int(self.bit_length_entry.get())
-        except ValueError:
-            messagebox.showerror("Error", "Invalid bit length")
+            self.rsa_generator = RSAKeyGenerator(bit_length=int(self.bit_length_entry.get()))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid bit length: {e}")
             return
         self.status_label.config(text="Generating keys...")
-        self.update_idletasks()
-        self.rsa_generator.bit_length = bit_length
-        public_key, private_key = self.rsa_generator.generate_keys()
+        self.tasks.submit(
+            lambda cancel, report: self.rsa_generator.generate_keys(cancel=cancel, on_progress=report),
+            on_progress=lambda tested: self.show_status(keygen_status(tested, self.tasks.elapsed())),
+            on_done=self.keys_generated,
+            on_error=lambda e: self.task_failed("Key Generation Error", e),
+            on_cancel=lambda: self.show_status("Key generation cancelled."),
+        )
+
+    def keys_generated(self, keys):
+        public_key, private_key = keys
         self.public_key = public_key
         self.private_key = private_key
         self.status_label.config(
             text=f"Keys generated.\nPublic: {public_key}\nPrivate: {private_key}"
         )
 
+    def task_failed(self, title, error):
+        messagebox.showerror(title, f"Operation failed: {error}")
+        self.status_label.config(text="Operation failed.")
+
     def encrypt_file(self):
+        if self.busy():
+            return
         if self.public_key is None:
             messagebox.showerror("Error", "Please generate keys first!")
             return
         file_path = filedialog.askopenfilename(title="Select a file to encrypt")
         if file_path:
             self.status_label.config(text="Encrypting file...")
-            self.update_idletasks()
-            with open(file_path, "rb") as f:
-                data = f.read()
-            encrypted_chunks = encrypt_data(data, self.public_key)
-            enc_file = file_path + ".enc"
-            with open(enc_file, "w") as f:
-                for c in encrypted_chunks:
-                    f.write(str(c) + "\n")
-            self.status_label.config(text=f"File encrypted:\n{enc_file}")
+            mode = MODE_ENVELOPE if self.envelope_var.get() else MODE_BLOCKS
+            block_bytes = modulus_bytes(self.public_key) - 1 if mode == MODE_BLOCKS else None
+            public_key = self.public_key
+            enc_file = encrypted_path(file_path)
+            self.tasks.submit(
+                lambda cancel, report: encrypt_file(file_path, enc_file, public_key, mode,
+                                                    cancel=cancel, on_progress=report),
+                on_progress=lambda done, total: self.show_status(
+                    transfer_status("Encrypting", done, total, self.tasks.elapsed(), block_bytes)),
+                on_done=lambda _: self.show_status(f"File encrypted:\n{enc_file}"),
+                on_error=lambda e: self.task_failed("Encryption Error", e),
+                on_cancel=lambda: self.show_status("Encryption cancelled."),
+            )
 
     def decrypt_file(self):
+        if self.busy():
+            return
         if self.private_key is None:
             messagebox.showerror("Error", "Please generate keys first!")
             return
@@ -81,15 +131,17 @@ class EncryptionApp(tk.Tk):
         )
         if file_path:
             self.status_label.config(text="Decrypting file...")
-            self.update_idletasks()
-            with open(file_path, "r") as f:
-                lines = f.readlines()
-            encrypted_chunks = [int(line.strip()) for line in lines]
-            decrypted_bytes = decrypt_data(encrypted_chunks, self.private_key)
-            dec_file = file_path.replace(".enc", ".dec")
-            with open(dec_file, "wb") as f:
-                f.write(decrypted_bytes)
-            self.status_label.config(text=f"File decrypted:\n{dec_file}")
+            private_key = self.private_key
+            dec_file = decrypted_path(file_path)
+            self.tasks.submit(
+                lambda cancel, report: decrypt_file(file_path, dec_file, private_key,
+                                                    cancel=cancel, on_progress=report),
+                on_progress=lambda done, total: self.show_status(
+                    transfer_status("Decrypting", done, total, self.tasks.elapsed())),
+                on_done=lambda _: self.show_status(f"File decrypted:\n{dec_file}"),
+                on_error=lambda e: self.task_failed("Decryption Error", e),
+                on_cancel=lambda: self.show_status("Decryption cancelled."),
+            )
 
 if __name__ == "__main__":
     app = EncryptionApp()
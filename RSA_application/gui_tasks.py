@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rsa import Cancelled
+
+POLL_MS = 100  # How often the Tk event loop collects results from the worker.
+MB = 1 << 20
+
+
+def transfer_status(verb, done, total, seconds, block_bytes=None):
+    """Progress line such as 'Encrypting: 12.0 of 50.0 MB, 49152 blocks, 4.1 MB/s'."""
+    text = f"{verb}: {done / MB:.1f}"
+    if total:
+        text += f" of {total / MB:.1f}"
+    text += " MB"
+    if block_bytes:
+        text += f", {-(-done // block_bytes)} blocks"
+    if seconds > 0:
+        text += f", {done / MB / seconds:.1f} MB/s"
+    return text
+
+
+def keygen_status(tested, seconds):
+    """Progress line for a prime search."""
+    text = f"Generating RSA keys: {tested} candidates tested"
+    if seconds > 0:
+        text += f" ({tested / seconds:.0f}/s)"
+    return text
+
+
+class TaskRunner:
+    """
+    Runs one long operation at a time off the Tk main thread.
+
+    The operation is called as func(cancel, report) on a worker thread, where
+    cancel is a threading.Event it must check and report(*args) sends progress.
+    Progress, the result and any error travel back through a queue that the Tk
+    event loop polls with after(), so every callback runs on the main thread.
+    The heavy lifting itself (prime search, RSA blocks) runs in worker
+    processes started by the operation, which Cancel also stops.
+    If a cancel_button is given it is enabled only while an operation runs.
+    """
+
+    def __init__(self, root, cancel_button=None, poll_ms=POLL_MS):
+        self.root = root
+        self.cancel_button = cancel_button
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.cancel_event = None
+        self.started = None
+        self._callbacks = None
+
+    @property
+    def busy(self):
+        return self._callbacks is not None
+
+    def elapsed(self):
+        """Seconds since the current operation started."""
+        return time.perf_counter() - self.started
+
+    def submit(self, func, on_progress=None, on_done=None, on_error=None, on_cancel=None):
+        """Start func(cancel, report); callbacks are invoked on the Tk thread."""
+        if self.busy:
+            raise RuntimeError("Another operation is still running.")
+        self.cancel_event = cancel = threading.Event()
+        self._callbacks = (on_progress, on_done, on_error, on_cancel)
+        self.started = time.perf_counter()
+        self._set_cancel_state("normal")
+        events = self.events
+
+        def run():
+            try:
+                result = func(cancel, lambda *args: events.put(("progress", args)))
+            except Cancelled:
+                events.put(("cancelled", None))
+            except Exception as e:
+                events.put(("error", e))
+            else:
+                events.put(("done", result))
+
+        self.executor.submit(run)
+        self.root.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+
+    def _set_cancel_state(self, state):
+        if self.cancel_button is not None:
+            self.cancel_button.config(state=state)
+
+    def shutdown(self):
+        """Cancel any running operation and release the worker thread."""
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _poll(self):
+        on_progress, on_done, on_error, on_cancel = self._callbacks
+        progress = None
+        while True:
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = value  # Only the latest report is worth drawing.
+                continue
+            self._callbacks = None
+            self._set_cancel_state("disabled")
+            if kind == "done" and on_done:
+                on_done(value)
+            elif kind == "error" and on_error:
+                on_error(value)
+            elif kind == "cancelled" and on_cancel:
+                on_cancel()
+            return
+        if progress is not None and on_progress:
+            on_progress(*progress)
+        self.root.after(self.poll_ms, self._poll)
@@ -0,0 +1,177 @@
+"""
+Precomputed per-key state and a cache of it.
+
+A KeyContext is the key tuple itself, (e, n), (d, n) or the extended private
+key (d, n, p, q, dp, dq, qinv[, others]), so it can be passed anywhere a key
+is expected, with the sizes every block operation needs computed once.
+Key files are parsed by a small tokenizer that only accepts integers,
+commas and parentheses/brackets, instead of eval.
+"""
+import os
+import re
+from collections import OrderedDict
+
+KEY_CACHE_SIZE = 256
+MAX_KEY_FILE_BYTES = 1 << 20
+
+_TOKEN = re.compile(r"\s*(?:(-?\d+)|([(\[])|([)\]])|(,))")
+
+
+class KeyContext(tuple):
+    """
+    An RSA key with precomputed sizes.
+
+    n, exponent  modulus and the first element (e for public, d for private keys)
+    modulus_bytes  width of one ciphertext block
+    chunk_size     plaintext bytes carried by one block
+    p, q, dp, dq, qinv  CRT parameters of an extended private key, else None
+    others         (r, d mod (r - 1), t) triples of a multi-prime key, else ()
+    """
+
+    def __new__(cls, key):
+        if isinstance(key, cls):
+            return key
+        key = tuple(key)
+        if len(key) < 2 or not isinstance(key[0], int) or not isinstance(key[1], int) or key[1] < 2:
+            raise ValueError("Not an RSA key.")
+        self = super().__new__(cls, key)
+        self.exponent = key[0]
+        self.n = key[1]
+        bits = self.n.bit_length()
+        self.modulus_bytes = (bits + 7) // 8
+        self.chunk_size = (bits - 1) // 8
+        if len(key) >= 7:
+            if not all(isinstance(value, int) for value in key[2:7]):
+                raise ValueError("Not an RSA key.")
+            self.p, self.q, self.dp, self.dq, self.qinv = key[2:7]
+            self.others = key[7] if len(key) > 7 else ()
+        else:
+            self.p = self.q = self.dp = self.dq = self.qinv = None
+            self.others = ()
+        return self
+
+    @property
+    def cache_key(self):
+        # The modulus alone would mix up the public and private key of one pair.
+        return self.n, self.exponent
+
+
+def _tokenize(text):
+    """(integer, opening, closing, comma) groups; anything else is rejected."""
+    text = text.strip()
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Unexpected character {text[position]!r} in key.")
+        yield match.groups()
+        position = match.end()
+
+
+def _parse(tokens, i):
+    """Parse the integer or (nested) tuple starting at tokens[i]; returns (value, next index)."""
+    if i >= len(tokens):
+        raise ValueError("Unexpected end of key.")
+    number, opening, _, _ = tokens[i]
+    if number is not None:
+        return int(number), i + 1
+    if opening is None:
+        raise ValueError("Expected an integer or '(' in key.")
+    items = []
+    i += 1
+    while i < len(tokens) and not tokens[i][2]:
+        value, i = _parse(tokens, i)
+        items.append(value)
+        if i < len(tokens) and tokens[i][3]:
+            i += 1
+        elif i < len(tokens) and not tokens[i][2]:
+            raise ValueError("Expected ',' between key values.")
+    if i >= len(tokens):
+        raise ValueError("Unterminated key tuple.")
+    return tuple(items), i + 1
+
+
+def parse_key(text):
+    """Parse a key written as a tuple of integers (tuples may nest), without eval."""
+    tokens = list(_tokenize(text))
+    key, end = _parse(tokens, 0)
+    if end != len(tokens):
+        raise ValueError("Trailing data after key.")
+    if not isinstance(key, tuple):
+        raise ValueError("A key must be a tuple of integers.")
+    return KeyContext(key)
+
+
+def load_key_file(path):
+    """Read and parse a key file written at registration."""
+    if os.path.getsize(path) > MAX_KEY_FILE_BYTES:
+        raise ValueError(f"{path} is too large to be a key file.")
+    with open(path, "r") as f:
+        return parse_key(f.read())
+
+
+def save_key_file(path, key):
+    """Write a key file readable by its owner only; private keys carry the primes."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, 0o600)  # O_CREAT's mode does not apply to a file that already existed.
+    with os.fdopen(fd, "w") as f:
+        f.write(str(tuple(key)))
+
+
+class KeyCache:
+    """
+    Bounded LRU cache of KeyContexts keyed by modulus (and exponent).
+
+    Key files are remembered by path together with their modification time
+    and size, so a file that changes is parsed again on the next lookup.
+    """
+
+    def __init__(self, maxsize=KEY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.contexts = OrderedDict()
+        self.files = {}  # path -> ((mtime_ns, size), cache key)
+
+    def __len__(self):
+        return len(self.contexts)
+
+    def get(self, key):
+        """The cached context for a key tuple, creating it on first use."""
+        cache_key = (key[1], key[0])
+        cached = self.contexts.get(cache_key)
+        if cached is not None and tuple.__eq__(cached, tuple(key)):
+            self.contexts.move_to_end(cache_key)
+            return cached
+        context = KeyContext(key)
+        self._store(context)
+        return context
+
+    def from_file(self, path):
+        """The context for a key file, parsed again only when the file has changed."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        entry = self.files.get(path)
+        if entry is not None and entry[0] == stamp and entry[1] in self.contexts:
+            self.contexts.move_to_end(entry[1])
+            return self.contexts[entry[1]]
+        context = load_key_file(path)
+        self.files[path] = (stamp, context.cache_key)
+        self._store(context)
+        return context
+
+    def _store(self, context):
+        self.contexts[context.cache_key] = context
+        self.contexts.move_to_end(context.cache_key)
+        while len(self.contexts) > self.maxsize:
+            self.contexts.popitem(last=False)
+        if len(self.files) > 4 * self.maxsize:
+            live = set(self.contexts)
+            self.files = {path: entry for path, entry in self.files.items() if entry[1] in live}
+
+    def clear(self):
+        self.contexts.clear()
+        self.files.clear()
+
+
+key_cache = KeyCache()
@@ -1,30 +1,46 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
-import json
 import os
-from rsa import RSAKeyGenerator, encrypt_data, decrypt_data
-
-USERS_FILE = "users.json"
-
-def load_users():
-    """Load the registered users from a JSON file."""
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_users(users):
-    """Save the users dictionary to a JSON file."""
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+from rsa import KEYGEN_ERROR_BOUND, RSAKeyGenerator
+from primality import PrimalityTester
+from prime_pool import DEFAULT_POOL_DIR, PrimePool
+from user_store import LEGACY_USERS_FILE, USERS_DB, UserStore
+from container import (MODE_BLOCKS, MODE_ENVELOPE, decrypt_file, decrypted_path, encrypt_file, encrypted_path,
+                       modulus_bytes)
+from gui_tasks import TaskRunner, keygen_status, transfer_status
+from key_context import key_cache, save_key_file
+
+PARALLEL_KEYGEN_MIN_BITS = 512  # Below this, process start-up costs more than the search.
+FILE_WORKERS = os.cpu_count() or 1  # Processes sharing the RSA blocks of one file.
+USER_MENU_LIMIT = 200  # Usernames listed in the dropdown; type a prefix to narrow it down.
 
 class MultiUserEncryptionApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Multi-User Secure File Encryption with RSA")
         self.geometry("800x600")
-        self.users = load_users()  # Dictionary mapping username to public key.
+        self.users = UserStore(USERS_DB, legacy_path=LEGACY_USERS_FILE)  # Username -> public key.
+        # Primes for registration are generated ahead of time in the background.
+        self.prime_pool = PrimePool(DEFAULT_POOL_DIR, tester=PrimalityTester(error_bound=KEYGEN_ERROR_BOUND))
         self.create_widgets()
+        # Key generation and file work run in the background; see gui_tasks.
+        self.tasks = TaskRunner(self, cancel_button=self.cancel_button)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def close(self):
+        self.tasks.shutdown()
+        self.prime_pool.stop()
+        self.destroy()
+
+    def busy(self):
+        """Tell the user to wait (and return True) while an operation is running."""
+        if self.tasks.busy:
+            messagebox.showerror("Busy", "Another operation is still running. Wait for it or cancel it first.")
+            return True
+        return False
+
+    def show_status(self, text):
+        self.status_label.config(text=text)
 
     def create_widgets(self):
         # Registration Frame
@@ -50,13 +66,20 @@ class MultiUserEncryptionApp(tk.Tk):
         tk.Label(enc_frame, text="Select Username:").pack(side="left", padx=5)
         self.enc_username_var = tk.StringVar(enc_frame)
         # Set default: if there is a user, use it; otherwise, use a placeholder.
-        default_user = next(iter(self.users)) if self.users else "Select User"
+        default_user = self.users.first() or "Select User"
         self.enc_username_var.set(default_user)
         # Initialize OptionMenu with just the default value.
         self.enc_user_menu = tk.OptionMenu(enc_frame, self.enc_username_var, default_user)
         self.enc_user_menu.pack(side="left", padx=5)
-        self.update_user_options()  # Update the OptionMenu with all registered users
-        
+        tk.Label(enc_frame, text="Filter:").pack(side="left", padx=5)
+        self.enc_filter_entry = tk.Entry(enc_frame, width=10)
+        self.enc_filter_entry.pack(side="left", padx=5)
+        self.enc_filter_entry.bind("<KeyRelease>", lambda event: self.update_user_options())
+        self.update_user_options()  # Update the OptionMenu with the registered users
+
+        self.envelope_var = tk.BooleanVar(enc_frame, value=True)
+        tk.Checkbutton(enc_frame, text="Envelope mode (fast, for large files)",
+                       variable=self.envelope_var).pack(side="left", padx=5)
         tk.Button(enc_frame, text="Encrypt File", command=self.encrypt_file).pack(side="left", padx=5)
 
         # Decryption Frame
@@ -70,22 +93,26 @@ class MultiUserEncryptionApp(tk.Tk):
         tk.Button(dec_frame, text="Select Private Key File", command=self.select_private_key).pack(side="left", padx=5)
         tk.Button(dec_frame, text="Decrypt File", command=self.decrypt_file).pack(side="left", padx=5)
 
-        self.status_label = tk.Label(self, text="Status: Idle", anchor="w", justify="left")
-        self.status_label.pack(fill="both", padx=10, pady=10)
+        status_frame = tk.Frame(self)
+        status_frame.pack(fill="both", padx=10, pady=10)
+        self.cancel_button = tk.Button(status_frame, text="Cancel", state="disabled",
+                                       command=lambda: self.tasks.cancel())
+        self.cancel_button.pack(side="right", padx=5)
+        self.status_label = tk.Label(status_frame, text="Status: Idle", anchor="w", justify="left")
+        self.status_label.pack(side="left", fill="both", expand=True)
 
         # Hold private key path for decryption.
         self.private_key_path = None
 
     def update_user_options(self):
-        """Update the dropdown list of registered usernames."""
+        """Update the dropdown list with the usernames matching the filter prefix."""
         # Clear the current menu
         menu = self.enc_user_menu["menu"]
         menu.delete(0, "end")
-        
-        # If there are users, add each one as an option
-        if self.users:
-            # Sort keys if you want a consistent order
-            user_list = sorted(self.users.keys())
+
+        # Only the first USER_MENU_LIMIT matches are listed, already sorted by the store.
+        user_list = self.users.search(self.enc_filter_entry.get().strip(), limit=USER_MENU_LIMIT)
+        if user_list:
             for username in user_list:
                 menu.add_command(
                     label=username,
@@ -100,6 +127,8 @@ class MultiUserEncryptionApp(tk.Tk):
 
 
     def register_user(self):
+        if self.busy():
+            return
         username = self.reg_username_entry.get().strip()
         if not username:
             messagebox.showerror("Error", "Username cannot be empty.")
@@ -109,61 +138,73 @@ class MultiUserEncryptionApp(tk.Tk):
             return
         try:
             bit_length = int(self.reg_bit_length_entry.get())
-        except ValueError:
-            messagebox.showerror("Error", "Invalid bit length.")
+            workers = os.cpu_count() if bit_length >= PARALLEL_KEYGEN_MIN_BITS else 1
+            rsa_gen = RSAKeyGenerator(bit_length=bit_length, error_bound=KEYGEN_ERROR_BOUND, workers=workers,
+                                      pool=self.prime_pool)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid bit length: {e}")
             return
 
         self.status_label.config(text="Generating RSA keys for user...")
-        self.update_idletasks()
-        rsa_gen = RSAKeyGenerator(bit_length=bit_length, test_rounds=bit_length)
-        public_key, private_key = rsa_gen.generate_keys()
-
-        # Store public key (as a list for JSON compatibility).
-        self.users[username] = list(public_key)
-        save_users(self.users)
-        self.update_user_options()  # update OptionMenu after registration
+        self.tasks.submit(
+            lambda cancel, report: rsa_gen.generate_keys(cancel=cancel, on_progress=report),
+            on_progress=lambda tested: self.show_status(keygen_status(tested, self.tasks.elapsed())),
+            on_done=lambda keys: self.finish_registration(username, *keys),
+            on_error=lambda e: self.task_failed("Key Generation Error", e),
+            on_cancel=lambda: self.status_label.config(text="Registration cancelled."),
+        )
 
-        # Prompt user to save their private key.
+    def finish_registration(self, username, public_key, private_key):
+        # Prompt user to save their private key; the user is only stored once it is saved.
         file_path = filedialog.asksaveasfilename(
             title="Save Your Private Key", defaultextension=".key",
             filetypes=[("Key Files", "*.key")]
         )
         if file_path:
-            with open(file_path, "w") as f:
-                f.write(str(private_key))
+            save_key_file(file_path, private_key)
+            try:
+                self.users.add(username, public_key)
+            except ValueError as e:  # Registered by someone else while the keys were generated.
+                messagebox.showerror("Error", str(e))
+                self.status_label.config(text="Registration aborted.")
+                return
+            self.update_user_options()  # update OptionMenu after registration
             messagebox.showinfo("Registration Complete", f"User '{username}' registered successfully.\nPrivate key saved to {file_path}")
             self.status_label.config(text=f"User '{username}' registered successfully.")
         else:
             messagebox.showwarning("Warning", "Private key not saved. Registration aborted.")
-            # Remove user since private key wasn't saved.
-            del self.users[username]
-            save_users(self.users)
-            self.update_user_options()
             self.status_label.config(text="Registration aborted.")
 
+    def task_failed(self, title, error):
+        messagebox.showerror(title, f"An error occurred: {error}")
+        self.status_label.config(text="Operation failed.")
 
     def encrypt_file(self):
+        if self.busy():
+            return
         username = self.enc_username_var.get().strip()
         if username not in self.users:
             messagebox.showerror("Error", "Selected user not found.")
             return
 
-        public_key = tuple(self.users[username])
+        public_key = key_cache.get(self.users.public_key(username))
         file_path = filedialog.askopenfilename(title="Select a file to encrypt")
         if not file_path:
             return
 
         self.status_label.config(text="Encrypting file...")
-        self.update_idletasks()
-        with open(file_path, "rb") as f:
-            data = f.read()
-
-        encrypted_chunks = encrypt_data(data, public_key)
-        enc_file = file_path + ".enc"
-        with open(enc_file, "w") as f:
-            for c in encrypted_chunks:
-                f.write(str(c) + "\n")
-        self.status_label.config(text=f"File encrypted and saved as:\n{enc_file}")
+        mode = MODE_ENVELOPE if self.envelope_var.get() else MODE_BLOCKS
+        block_bytes = modulus_bytes(public_key) - 1 if mode == MODE_BLOCKS else None
+        enc_file = encrypted_path(file_path)
+        self.tasks.submit(
+            lambda cancel, report: encrypt_file(file_path, enc_file, public_key, mode, workers=FILE_WORKERS,
+                                                cancel=cancel, on_progress=report),
+            on_progress=lambda done, total: self.show_status(
+                transfer_status("Encrypting", done, total, self.tasks.elapsed(), block_bytes)),
+            on_done=lambda _: self.status_label.config(text=f"File encrypted and saved as:\n{enc_file}"),
+            on_error=lambda e: self.task_failed("Encryption Error", e),
+            on_cancel=lambda: self.status_label.config(text="Encryption cancelled."),
+        )
 
     def select_private_key(self):
         self.private_key_path = filedialog.askopenfilename(
@@ -173,6 +214,8 @@ class MultiUserEncryptionApp(tk.Tk):
             self.status_label.config(text=f"Private key file selected:\n{self.private_key_path}")
 
     def decrypt_file(self):
+        if self.busy():
+            return
         username = self.dec_username_entry.get().strip()
         if not username:
             messagebox.showerror("Error", "Please enter a username for decryption.")
@@ -187,35 +230,32 @@ class MultiUserEncryptionApp(tk.Tk):
         if not file_path:
             return
 
-        # Read private key from file (expecting string representation of a tuple).
+        # Parsed once and cached; read again only if the key file changes.
         try:
-            with open(self.private_key_path, "r") as f:
-                key_str = f.read().strip()
-            private_key = eval(key_str)  # Use caution: eval() assumes trusted input.
+            private_key = key_cache.from_file(self.private_key_path)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load private key: {e}")
             return
 
         self.status_label.config(text="Decrypting file...")
-        self.update_idletasks()
-        try:
-            with open(file_path, "r") as f:
-                lines = f.readlines()
-            encrypted_chunks = [int(line.strip()) for line in lines]
-            decrypted_bytes = decrypt_data(encrypted_chunks, private_key)
-        except OverflowError as oe:
+        dec_file = decrypted_path(file_path)
+        self.tasks.submit(
+            lambda cancel, report: decrypt_file(file_path, dec_file, private_key, workers=FILE_WORKERS,
+                                                cancel=cancel, on_progress=report),
+            on_progress=lambda done, total: self.show_status(
+                transfer_status("Decrypting", done, total, self.tasks.elapsed())),
+            on_done=lambda _: self.status_label.config(text=f"File decrypted and saved as:\n{dec_file}"),
+            on_error=self.decryption_failed,
+            on_cancel=lambda: self.status_label.config(text="Decryption cancelled."),
+        )
+
+    def decryption_failed(self, error):
+        if isinstance(error, OverflowError):
             messagebox.showerror("Decryption Error", "Decryption failed. Incorrect private key or username may have been provided.")
             self.status_label.config(text="Decryption failed due to an incorrect key.")
-            return
-        except Exception as e:
-            messagebox.showerror("Decryption Error", f"An error occurred during decryption: {e}")
+        else:
+            messagebox.showerror("Decryption Error", f"An error occurred during decryption: {error}")
             self.status_label.config(text="Decryption failed.")
-            return
-
-        dec_file = file_path.replace(".enc", ".dec")
-        with open(dec_file, "wb") as f:
-            f.write(decrypted_bytes)
-        self.status_label.config(text=f"File decrypted and saved as:\n{dec_file}")
 
 
 if __name__ == "__main__":
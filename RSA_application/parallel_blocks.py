@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+from collections import deque
+from key_context import KeyContext
+from rsa import decrypt_data, encrypt_data
+
+BATCH_BLOCKS = 128      # RSA blocks handed to a worker per task.
+IN_FLIGHT_PER_WORKER = 2  # Outstanding batches per worker; bounds memory held by the pool.
+
+
+def _encrypt_batch(task):
+    data, public_key = task
+    return encrypt_data(data, public_key)
+
+
+def _decrypt_batch(task):
+    blocks, private_key, length = task
+    return decrypt_data(blocks, private_key, length=length)
+
+
+class BlockPool:
+    """
+    Process pool for independent RSA blocks.
+
+    Work is submitted in batches and results come back in submission order.
+    At most workers * IN_FLIGHT_PER_WORKER batches are outstanding at a time,
+    so a lazy task iterator (e.g. one reading a file) is only consumed as fast
+    as the workers keep up. With one worker everything runs in this process.
+    """
+
+    def __init__(self, workers=None, batch_blocks=BATCH_BLOCKS):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_blocks = batch_blocks
+        self.pool = multiprocessing.Pool(self.workers) if self.workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def map_ordered(self, func, tasks):
+        """Yield func(task) for every task, in order, with bounded in-flight batches."""
+        if self.pool is None:
+            for task in tasks:
+                yield func(task)
+            return
+        limit = self.workers * IN_FLIGHT_PER_WORKER
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= limit:
+                yield pending.popleft().get()
+            pending.append(self.pool.apply_async(func, (task,)))
+        while pending:
+            yield pending.popleft().get()
+
+    def encrypt_batches(self, data_batches, public_key):
+        """Encrypt an iterable of plaintext byte strings, yielding a block list for each."""
+        return self.map_ordered(_encrypt_batch, ((data, public_key) for data in data_batches))
+
+    def decrypt_batches(self, block_batches, private_key):
+        """Decrypt an iterable of (blocks, length) pairs, yielding the plaintext of each."""
+        return self.map_ordered(_decrypt_batch, ((blocks, private_key, length)
+                                                 for blocks, length in block_batches))
+
+    def encrypt_data(self, data, public_key):
+        """Parallel equivalent of rsa.encrypt_data."""
+        public_key = KeyContext(public_key)
+        step = self.batch_blocks * public_key.chunk_size
+        view = memoryview(data)
+        batches = (bytes(view[i:i + step]) for i in range(0, len(view), step))
+        return [c for blocks in self.encrypt_batches(batches, public_key) for c in blocks]
+
+    def decrypt_data(self, encrypted_chunks, private_key, length=None):
+        """Parallel equivalent of rsa.decrypt_data."""
+        private_key = KeyContext(private_key)
+        return b"".join(self.decrypt_batches(self._split(encrypted_chunks, private_key.chunk_size, length),
+                                             private_key))
+
+    def _split(self, encrypted_chunks, chunk_size, length):
+        """Group blocks into batches, with the plaintext length each batch covers."""
+        blocks = list(encrypted_chunks)
+        for i in range(0, len(blocks), self.batch_blocks):
+            batch = blocks[i:i + self.batch_blocks]
+            part = None
+            if length is not None:
+                part = max(0, min(length - i * chunk_size, len(batch) * chunk_size))
+            yield batch, part
+
+
+def encrypt_data_parallel(data, public_key, workers=None):
+    """Encrypt data like rsa.encrypt_data, spreading the blocks over a process pool."""
+    with BlockPool(workers) as pool:
+        return pool.encrypt_data(data, public_key)
+
+
+def decrypt_data_parallel(encrypted_chunks, private_key, length=None, workers=None):
+    """Decrypt blocks like rsa.decrypt_data, spreading them over a process pool."""
+    with BlockPool(workers) as pool:
+        return pool.decrypt_data(encrypted_chunks, private_key, length=length)
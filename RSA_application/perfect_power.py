@@ -0,0 +1,71 @@
+import math
+from sieve import primes_up_to
+
+RESIDUE_FILTER_MODULI = 4       # Small primes used to pre-screen each exponent.
+RESIDUE_FILTER_PRIME_LIMIT = 1 << 14
+
+# Squares modulo 64, 63, 65 and 11 reject ~99% of non-squares before any root is taken.
+_SQUARE_FILTERS = [(m, frozenset(x * x % m for x in range(m))) for m in (64, 63, 65, 11)]
+_FILTER_PRIMES = primes_up_to(RESIDUE_FILTER_PRIME_LIMIT)
+_power_filters = {}
+
+
+def integer_nth_root(n, k):
+    """Integer part of the k-th root of n, by Newton's iteration."""
+    if n < 0:
+        raise ValueError("Cannot take the root of a negative number.")
+    if n < 2 or k == 1:
+        return n
+    if k == 2:
+        return math.isqrt(n)
+    bits = n.bit_length()
+    if k >= bits:
+        return 1
+    # 2^ceil(bits/k) is above the root, and Newton decreases monotonically from above.
+    x = 1 << -(-bits // k)
+    while True:
+        y = ((k - 1) * x + n // x ** (k - 1)) // k
+        if y >= x:
+            return x
+        x = y
+
+
+def _filters_for(k):
+    """
+    Filter primes for the odd prime exponent k: for primes q = 1 (mod k), only
+    a 1/k fraction of the non-zero residues modulo q are k-th powers.
+    """
+    filters = _power_filters.get(k)
+    if filters is None:
+        filters = [q for q in _FILTER_PRIMES if q % k == 1][:RESIDUE_FILTER_MODULI]
+        _power_filters[k] = filters
+    return filters
+
+
+def _may_be_kth_power(n, k):
+    """Cheap necessary condition for n being a k-th power."""
+    if k == 2:
+        return all(n % m in squares for m, squares in _SQUARE_FILTERS)
+    for q in _filters_for(k):
+        # Euler's criterion: a non-zero residue is a k-th power iff a^((q-1)/k) = 1.
+        residue = n % q
+        if residue and pow(residue, (q - 1) // k, q) != 1:
+            return False
+    return True
+
+
+def is_perfect_power(n):
+    """Return True if n = a^b for integers a > 1, b > 1."""
+    if n < 4:
+        return False
+    bits = n.bit_length()
+    # Any perfect power is also a perfect p-th power for a prime p dividing b.
+    for k in primes_up_to(bits):
+        if not _may_be_kth_power(n, k):
+            continue
+        root = integer_nth_root(n, k)
+        if root < 2:
+            break
+        if root ** k == n:
+            return True
+    return False
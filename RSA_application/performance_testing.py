@@ -1,51 +1,331 @@
-# In this file we will test and time the performance of sqrt n algorithm and Miller-Rabin algorithm for primality testing on the RSA application.
+"""
+Benchmark suite for key generation, the primality algorithms, encryption and decryption.
 
+    python performance_testing.py run --output baseline.json
+    python performance_testing.py run --suite primality --bits 64 128 256 --timeout 30
+    python performance_testing.py compare baseline.json current.json --threshold 0.1
+
+Every case runs in its own process: first the warmup runs, then the timed
+repeats. A case that exceeds --timeout is killed and recorded as timed out.
+Larger sizes of the same algorithm are then skipped, which replaces fixed
+bit-length cutoffs. Results hold the raw samples, median and percentile
+statistics, and metadata about the machine, saved as JSON.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import queue
+import random
+import statistics
+import sys
 import time
-from rsa import RSAKeyGenerator
-
-def test_primality():
-    # testing on various bit lengths till 1024 bits if it takes more than 1min then report >1min for that bit length
-    # we will also make an organised markdown table for the results
-    bit_lengths = [16, 32, 64, 128, 256, 512, 1024, 2048]
-    results1 = []
-    results2 = []
-    result3 = []
-    for bit_length in bit_lengths:
-        if bit_length < 64:
-            start_time = time.perf_counter()()
-            rsa_gen = RSAKeyGenerator(bit_length=bit_length, algo="sqrt")
-            public_key, private_key = rsa_gen.generate_keys()
-            elapsed_time = time.perf_counter()() - start_time
-        else:
-            elapsed_time = "Very Large"
-        print (f"Bit Length: {bit_length}, Sqrt Time: {elapsed_time}")
-        results1.append(elapsed_time)
-    for bit_length in bit_lengths:
-        start_time = time.perf_counter()()
-        rsa_gen = RSAKeyGenerator(bit_length=bit_length, test_rounds=bit_length, algo="miller-rabin")
-        public_key, private_key = rsa_gen.generate_keys()
-        elapsed_time = time.perf_counter()() - start_time
-        print (f"Bit Length: {bit_length}, Miller-Rabin Time: {elapsed_time}")
-        results2.append(elapsed_time)
-    for bit_length in bit_lengths:
-        if bit_length < 256:
-            start_time = time.perf_counter()()
-            rsa_gen = RSAKeyGenerator(bit_length=bit_length, algo="aks")
-            public_key, private_key = rsa_gen.generate_keys()
-            elapsed_time = time.perf_counter()() - start_time
-            result3.append(elapsed_time)
+from benchmark_tools import format_result, isolate, kill, machine_metadata
+from container import MODE_BLOCKS, MODE_ENVELOPE, decrypt_stream, encrypt_stream
+from primality import PrimalityTester
+from rsa import KEYGEN_ERROR_BOUND, RSAKeyGenerator, generate_prime
+
+SCHEMA_VERSION = 1
+PRIMALITY_ALGOS = ("sqrt", "miller-rabin", "bpsw", "aks")
+PRIMALITY_BITS = [16, 32, 64, 128, 256, 512, 1024, 2048]
+KEYGEN_BITS = [256, 512, 1024]
+MODULUS_BITS = [1024, 2048]
+DATA_SIZE = 256 << 10
+PRIMES_PER_RUN = 8  # Distinct primes timed per primality sample, so one lucky input does not decide it.
+PERCENTILES = (10, 90)
+SUITES = ("keygen", "primality", "encrypt", "decrypt")
+
+
+def percentile(samples, q):
+    """q-th percentile of samples with linear interpolation between closest ranks."""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(samples):
+    """Statistics recorded for each case, in seconds."""
+    summary = {
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "max": max(samples),
+    }
+    for q in PERCENTILES:
+        summary[f"p{q}"] = percentile(samples, q)
+    return summary
+
+
+def build_cases(suites, primality_bits, keygen_bits, modulus_bits, size):
+    """Case descriptions (plain dicts, so they can be sent to a worker process)."""
+    cases = []
+    if "keygen" in suites:
+        cases += [{"suite": "keygen", "algo": "miller-rabin", "bits": bits} for bits in keygen_bits]
+    if "primality" in suites:
+        cases += [{"suite": "primality", "algo": algo, "bits": bits}
+                  for algo in PRIMALITY_ALGOS for bits in primality_bits]
+    for suite in ("encrypt", "decrypt"):
+        if suite in suites:
+            cases += [{"suite": suite, "mode": mode, "bits": bits, "size": size}
+                      for mode in ("blocks", "envelope") for bits in modulus_bits]
+    for case in cases:
+        case["id"] = "/".join(str(case[k]) for k in ("suite", "algo", "mode", "bits") if k in case)
+    return cases
+
+
+def _prepare(case):
+    """Set up inputs outside the timed region; returns a callable for one run."""
+    random.seed(case["bits"])  # The same inputs on every machine and run.
+    if case["suite"] == "keygen":
+        # RSAKeyGenerator's bit_length is per prime; the modulus is twice that.
+        generator = RSAKeyGenerator(bit_length=case["bits"] // 2, error_bound=KEYGEN_ERROR_BOUND)
+        return generator.generate_keys
+
+    if case["suite"] == "primality":
+        tester = PrimalityTester(error_bound=KEYGEN_ERROR_BOUND, aks_workers=os.cpu_count() or 1)
+        is_prime = {"sqrt": tester.is_prime_sqrt, "miller-rabin": tester.is_prime_miller_rabin,
+                    "bpsw": tester.is_prime_bpsw, "aks": tester.is_prime_aks}[case["algo"]]
+        # Primes are the worst case: no early exit on a witness or a small factor.
+        primes = [generate_prime(case["bits"], tester, "bpsw") for _ in range(PRIMES_PER_RUN)]
+
+        def run():
+            for p in primes:
+                if not is_prime(p):
+                    raise RuntimeError(f"{case['algo']} rejected the prime {p}.")
+        return run
+
+    public_key, private_key = RSAKeyGenerator(bit_length=case["bits"] // 2,
+                                              error_bound=KEYGEN_ERROR_BOUND).generate_keys()
+    mode = MODE_ENVELOPE if case["mode"] == "envelope" else MODE_BLOCKS
+    data = random.randbytes(case["size"])
+    encrypted = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), encrypted, public_key, mode)
+    ciphertext = encrypted.getvalue()
+    if case["suite"] == "encrypt":
+        return lambda: encrypt_stream(io.BytesIO(data), io.BytesIO(), public_key, mode)
+
+    def run():
+        out = io.BytesIO()
+        decrypt_stream(io.BytesIO(ciphertext), out, private_key)
+        if out.getvalue() != data:
+            raise RuntimeError("Decryption did not restore the input.")
+    return run
+
+
+def _run_case(case, warmup, repeats, results):
+    """Worker process body: report ("sample", seconds) per timed run, then ("done", None)."""
+    isolate()
+    try:
+        run = _prepare(case)
+        for _ in range(warmup):
+            run()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            results.put(("sample", time.perf_counter() - start))
+        results.put(("done", None))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def measure(case, warmup, repeats, timeout):
+    """Run one case in a fresh process; returns its result record."""
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(case, warmup, repeats, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    samples, status, error = [], "timeout", None
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            kind, value = results.get(timeout=min(remaining, 1.0))
+        except queue.Empty:
+            if not process.is_alive() and results.empty():
+                status, error = "error", f"worker exited with code {process.exitcode}"
+                break
+            continue
+        if kind == "sample":
+            samples.append(value)
+            continue
+        status, error = ("ok", None) if kind == "done" else ("error", value)
+        break
+    process.join(timeout=1.0 if status == "ok" else 0)
+    if process.is_alive():
+        kill(process)
+    if status == "ok" and not samples:
+        status = "error"
+        error = "no samples"
+    record = dict(case, status=status, warmup=warmup, repeats=repeats, samples=samples)
+    if error:
+        record["error"] = error
+    if samples:
+        record["stats"] = summarize(samples)
+        if "size" in case:
+            record["stats"]["mb_per_s"] = case["size"] / (1 << 20) / record["stats"]["median"]
+    return record
+
+
+def _family(case):
+    """Cases that differ only in size; a timeout skips the larger ones."""
+    return case["suite"], case.get("algo"), case.get("mode")
+
+
+def run_suite(cases, warmup, repeats, timeout):
+    records = []
+    timed_out = {}
+    for case in cases:
+        family = _family(case)
+        if family in timed_out and case["bits"] > timed_out[family]:
+            record = dict(case, status="skipped", samples=[],
+                          error=f"timed out at {timed_out[family]} bits")
         else:
-            elapsed_time = "Very Large"
-        print (f"Bit Length: {bit_length}, AKS Time: {elapsed_time}")
-        result3.append(elapsed_time)
-    #start writing the results to a markdown file performance_results.md
-    with open("performance_results2.md", "w") as f:
+            record = measure(case, warmup, repeats, timeout)
+            if record["status"] == "timeout":
+                timed_out[family] = case["bits"]
+        records.append(record)
+        print(format_record(record), flush=True)
+    return records
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
+
+
+def format_record(record):
+    measured = None
+    stats = record.get("stats")
+    if stats:
+        measured = (f"median {format_seconds(stats['median']):>10}  p10 {format_seconds(stats['p10']):>10}  "
+                    f"p90 {format_seconds(stats['p90']):>10}  n={len(record['samples'])}")
+        if "mb_per_s" in stats:
+            measured += f"  {stats['mb_per_s']:.2f} MB/s"
+    return format_result(f"{record['id']:<28} ", record["status"], record.get("error"), measured)
+
+
+def write_markdown(path, report):
+    """A results table with the same columns for every row."""
+    meta = report["metadata"]
+    with open(path, "w") as f:
         f.write("# Performance Testing Results\n\n")
-        f.write("| Bit Length | AKS | Miller Rabin | sqrt |\n")
-        f.write("|------------|-----------|-----------|----------|\n")
-        for bit_length, time1, time2, time3 in zip(bit_lengths, results2, results1, result3):
-            f.write(f"| {bit_length} | {time3} | {time1} | {time2} |\n")
+        f.write(f"- **Platform**: {meta['platform']} ({meta['cpu_count']} CPUs)\n")
+        f.write(f"- **Python**: {meta['python']}\n- **{meta['backend']}**\n")
+        f.write(f"- **Runs**: {report['warmup']} warmup, {report['repeats']} timed, "
+                f"{report['timeout']} s timeout per case\n\n")
+        f.write("| Case | Median | p10 | p90 | Runs | Status |\n")
+        f.write("|------|--------|-----|-----|------|--------|\n")
+        for record in report["results"]:
+            stats = record.get("stats")
+            cells = [format_seconds(stats[k]) for k in ("median", "p10", "p90")] if stats else ["-"] * 3
+            status = record["status"] + (f": {record['error']}" if "error" in record else "")
+            f.write(f"| {record['id']} | {' | '.join(cells)} | {len(record['samples'])} | {status} |\n")
+
+
+def compare(baseline, current, threshold):
+    """
+    Median ratio current/baseline for every case measured in both reports.
+    Returns (rows, regressions), where a regression is a ratio above 1 + threshold
+    or a case that ran in the baseline but no longer completes.
+    """
+    base = {r["id"]: r for r in baseline["results"]}
+    rows, regressions = [], []
+    for record in current["results"]:
+        old = base.get(record["id"])
+        if old is None or "stats" not in old or old["status"] != "ok":
+            continue
+        if record["status"] != "ok" or "stats" not in record:
+            rows.append((record["id"], old["stats"]["median"], None, None, record["status"]))
+            regressions.append(record["id"])
+            continue
+        ratio = record["stats"]["median"] / old["stats"]["median"]
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+            regressions.append(record["id"])
+        elif ratio < 1 / (1 + threshold):
+            verdict = "faster"
+        else:
+            verdict = "same"
+        rows.append((record["id"], old["stats"]["median"], record["stats"]["median"], ratio, verdict))
+    return rows, regressions
 
-if __name__ == "__main__":
-    test_primality()
 
+def cmd_run(args):
+    cases = build_cases(args.suite, args.bits or PRIMALITY_BITS, args.keygen_bits, args.modulus_bits,
+                        args.size << 10)
+    report = {"schema": SCHEMA_VERSION, "metadata": machine_metadata(), "warmup": args.warmup,
+              "repeats": args.repeats, "timeout": args.timeout}
+    print(f"{report['metadata']['platform']}, {report['metadata']['python']}, {report['metadata']['backend']}")
+    report["results"] = run_suite(cases, args.warmup, args.repeats, args.timeout)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.markdown:
+        write_markdown(args.markdown, report)
+    return 1 if any(r["status"] == "error" for r in report["results"]) else 0
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ("platform", "cpu_count", "python", "backend"):
+        if baseline["metadata"].get(key) != current["metadata"].get(key):
+            print(f"warning: {key} differs: {baseline['metadata'].get(key)!r} vs {current['metadata'].get(key)!r}")
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'case':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for case_id, old, new, ratio, verdict in rows:
+        new_text = format_seconds(new) if new is not None else "-"
+        ratio_text = f"{ratio:.2f}x" if ratio is not None else "-"
+        print(f"{case_id:<28} {format_seconds(old):>10} {new_text:>10} {ratio_text:>7}  {verdict}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark key generation, primality tests and encryption.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run the benchmarks and save the results as JSON")
+    p.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    p.add_argument("--bits", type=int, nargs="+", help="prime sizes for the primality suite")
+    p.add_argument("--keygen-bits", type=int, nargs="+", default=KEYGEN_BITS, help="modulus sizes for keygen")
+    p.add_argument("--modulus-bits", type=int, nargs="+", default=MODULUS_BITS,
+                   help="modulus sizes for encryption and decryption")
+    p.add_argument("--size", type=int, default=DATA_SIZE >> 10, help="KiB of data per encryption run")
+    p.add_argument("--warmup", type=int, default=1, help="untimed runs per case (default: %(default)s)")
+    p.add_argument("--repeats", type=int, default=7, help="timed runs per case (default: %(default)s)")
+    p.add_argument("--timeout", type=float, default=60, help="seconds per case (default: %(default)s)")
+    p.add_argument("--output", default="performance_results.json")
+    p.add_argument("--markdown", help="also write a markdown table to this file")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("compare", help="flag regressions against a saved baseline")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.10,
+                   help="allowed slowdown of the median (default: %(default)s)")
+    p.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
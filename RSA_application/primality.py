@@ -1,10 +1,105 @@
 import random
 import math
+from aks_engine import aks
+from backend import is_strong_prp
+from batch_primality import is_prime_batch
+from perfect_power import integer_nth_root
+from trial_division_engine import is_prime as trial_division_is_prime
+
+SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47)
+
+# Miller-Rabin with the first 13 prime bases is exact for every n below this bound.
+DETERMINISTIC_MR_LIMIT = 3317044064679887385961981
+DETERMINISTIC_MR_BASES = SMALL_PRIMES[:13]
+
+def jacobi(a, n):
+    """Jacobi symbol (a/n) for odd positive n."""
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+def _log2_sum(*log_terms):
+    """log2 of a sum of terms given by their base-2 logarithms."""
+    top = max(log_terms)
+    return top + math.log2(sum(2 ** (x - top) for x in log_terms))
+
+def _dlp_log2_error(k, t):
+    """
+    log2 of the Damgard-Landrock-Pomerance upper bound on the probability that
+    a random odd k-bit integer passing t Miller-Rabin rounds is composite,
+    or None when none of their bounds applies to (k, t).
+    """
+    bounds = []
+    if t == 1 and k >= 2:
+        bounds.append(2 * math.log2(k) + 2 * (2 - math.sqrt(k)))
+    if k >= 21:
+        if (t == 2 and k >= 88) or 3 <= t <= k / 9:
+            bounds.append(1.5 * math.log2(k) + t - 0.5 * math.log2(t) + 2 * (2 - math.sqrt(t * k)))
+        if k / 9 <= t <= k / 4:
+            bounds.append(_log2_sum(
+                math.log2(7 / 20 * k) - 5 * t,
+                math.log2(k ** 3.75 / 7) - k / 2 - 2 * t,
+                math.log2(12 * k) - k / 4 - 3 * t,
+            ))
+        if t >= k / 4:
+            bounds.append(math.log2(k ** 3.75 / 7) - k / 2 - 2 * t)
+    return min(bounds) if bounds else None
+
+def rounds_for_error_bound(bits, error_bound, adversarial=False):
+    """
+    Number of Miller-Rabin rounds needed to keep the error probability below
+    error_bound for a candidate of the given bit length.
+
+    For adversarial inputs only the worst-case 4^-t bound holds. For randomly
+    chosen candidates the (much smaller) Damgard-Landrock-Pomerance bounds are
+    used, capped by the worst-case round count.
+    """
+    if not 0 < error_bound < 1:
+        raise ValueError("Error bound must be between 0 and 1.")
+    target = math.log2(error_bound)
+    worst_case = max(1, math.ceil(-target / 2))
+    if adversarial:
+        return worst_case
+    for t in range(1, worst_case):
+        bound = _dlp_log2_error(bits, t)
+        if bound is not None and bound <= target:
+            return t
+    return worst_case
 
 class PrimalityTester:
-    def __init__(self, test_rounds=5):
-        """Initialize with a given number of rounds for Miller-Rabin."""
+    def __init__(self, test_rounds=5, error_bound=None, adversarial=False, aks_workers=1):
+        """
+        Initialize with a given number of rounds for Miller-Rabin.
+        If error_bound is given (e.g. 2**-128) the number of rounds is instead
+        chosen per candidate bit length; set adversarial=True when the inputs
+        are not random candidates. aks_workers processes share the AKS
+        polynomial checks.
+        """
         self.test_rounds = test_rounds
+        self.aks_workers = aks_workers
+        self.error_bound = error_bound
+        self.adversarial = adversarial
+        self._rounds_by_bits = {}
+
+    def rounds_for(self, n):
+        """Number of Miller-Rabin rounds to run on n."""
+        if self.error_bound is None:
+            return self.test_rounds
+        bits = n.bit_length()
+        rounds = self._rounds_by_bits.get(bits)
+        if rounds is None:
+            rounds = rounds_for_error_bound(bits, self.error_bound, self.adversarial)
+            self._rounds_by_bits[bits] = rounds
+        return rounds
 
     def is_prime_miller_rabin(self, n):
         """Miller-Rabin probabilistic primality test."""
@@ -13,82 +108,86 @@ class PrimalityTester:
         if n <= 1 or n % 2 == 0:
             return False
 
-        # Express n-1 as 2^r * d with d odd.
-        r, d = 0, n - 1
-        while d % 2 == 0:
-            r += 1
-            d //= 2
-
         # Witness loop.
-        for _ in range(self.test_rounds):
+        for _ in range(self.rounds_for(n)):
             a = random.randrange(2, n - 1)
-            x = pow(a, d, n)
-            if x in (1, n - 1):
-                continue
-            for _ in range(r - 1):
-                x = pow(x, 2, n)
-                if x == n - 1:
-                    break
-                elif x == 1:
-                    return False
-            else:
+            if not is_strong_prp(n, a):
                 return False
         return True
 
-    def is_prime_sqrt(self, n):
-        """Simple O(√n) primality test."""
-        if n < 2:
-            return False
-        if n in (2, 3):
-            return True
-        if n % 2 == 0:
-            return False
-        for i in range(3, int(math.sqrt(n)) + 1, 2):
-            if n % i == 0:
+    def _is_strong_lucas_probable_prime(self, n):
+        """Strong Lucas test with Selfridge's parameters (P = 1, Q = (1 - D) / 4)."""
+        if math.isqrt(n) ** 2 == n:
+            return False  # No suitable D exists for perfect squares.
+        D = 5
+        while True:
+            j = jacobi(D, n)
+            if j == -1:
+                break
+            if j == 0 and abs(D) != n:
                 return False
-        return True
-    
-    def integer_nth_root(self, n, b):
-        """Finds the integer part of the b-th root of n."""
-        # Edge cases
-        if n < 2:
-            return n
-
-        # Binary search for the b-th root
-        low, high = 1, n
-        while low < high:
-            mid = (low + high + 1) // 2
-            if mid ** b <= n:
-                low = mid
-            else:
-                high = mid - 1
-        return low
-
-    # Usage in the perfect power check
-    def is_prime_aks(self, n):
-        if n <= 1:
-            return False
-        if n in (2, 3):
+            D = -D - 2 if D > 0 else -D + 2
+        P, Q = 1, (1 - D) // 4
+
+        # Express n+1 as 2^s * d with d odd.
+        s, d = 0, n + 1
+        while d % 2 == 0:
+            s += 1
+            d //= 2
+
+        # Compute U_d, V_d and Q^d mod n by walking the bits of d.
+        U, V, Qk = 1, P, Q % n
+        for bit in bin(d)[3:]:
+            U = U * V % n
+            V = (V * V - 2 * Qk) % n
+            Qk = Qk * Qk % n
+            if bit == "1":
+                U, V = (P * U + V) % n, (D * U + P * V) % n
+                # Halve modulo n (n is odd).
+                if U & 1:
+                    U += n
+                if V & 1:
+                    V += n
+                U, V = U >> 1, V >> 1
+                Qk = Qk * Q % n
+
+        if U == 0 or V == 0:
             return True
-        if n % 2 == 0:
+        for _ in range(s - 1):
+            V = (V * V - 2 * Qk) % n
+            if V == 0:
+                return True
+            Qk = Qk * Qk % n
+        return False
+
+    def is_prime_bpsw(self, n):
+        """
+        Baillie-PSW primality test: a base-2 strong test followed by a strong
+        Lucas test. Numbers below DETERMINISTIC_MR_LIMIT are instead decided
+        exactly by Miller-Rabin with a fixed set of bases.
+        """
+        if n < 2:
             return False
+        for p in SMALL_PRIMES:
+            if n % p == 0:
+                return n == p
 
-        # Check if n is a perfect power using integer-based root extraction
-        for b in range(2, int(math.log(n, 2)) + 1):
-            a = self.integer_nth_root(n, b)
-            if a ** b == n or (a + 1) ** b == n or (a - 1) ** b == n:
-                return False
+        if n < DETERMINISTIC_MR_LIMIT:
+            return all(is_strong_prp(n, a) for a in DETERMINISTIC_MR_BASES)
+        return is_strong_prp(n, 2) and self._is_strong_lucas_probable_prime(n)
 
-        # Check for small divisors.
-        for p in range(2, min(n, 100)):
-            if self.is_prime_sqrt(p) and n % p == 0:
-                return False
+    def is_prime_sqrt(self, n):
+        """Trial division up to isqrt(n) over a prime table and a mod-210 wheel."""
+        return trial_division_is_prime(n)
 
-        # Check the polynomial condition.
-        k = int(math.ceil(math.log(n, 2) ** 2))
-        for a in range(1, k + 1):
-            if pow(a, n, n) != a:
-                return False
+    def integer_nth_root(self, n, b):
+        """Finds the integer part of the b-th root of n."""
+        return integer_nth_root(n, b)
 
-        return True
+    def is_prime_aks(self, n):
+        """Deterministic AKS primality test (polynomial congruence version)."""
+        return aks(n, workers=self.aks_workers)
 
+    def is_prime_batch(self, values):
+        """Deterministic primality mask for a NumPy array of integers below 2^64."""
+        return is_prime_batch(values)
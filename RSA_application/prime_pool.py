@@ -0,0 +1,215 @@
+"""
+Persistent pool of pre-generated primes.
+
+Primes are kept per bit length in two files inside the pool directory:
+
+    primes_<bits>.bin   fixed-width big-endian records, ceil(bits / 8) bytes each
+    primes_<bits>.idx   magic "RPIX" | bits (u16) | next record to hand out (u64)
+                        | records written (u64)
+
+Only the small index is read to find the next prime, so opening a large pool
+costs nothing. Taking and adding primes happen under an exclusive lock on the
+index file, and the index is updated only after the records are on disk, so a
+prime is never handed out twice, even to several processes, and a writer
+killed mid-way leaves the pool consistent.
+
+The stored primes are the private factors of future keys, so the directory is
+created owner-only (0700), the files 0600, and a taken record is overwritten
+with zeros on disk before take() returns it.
+"""
+import multiprocessing
+import os
+import struct
+from primality import PrimalityTester
+from rsa import SCARCE_PRIME_BITS, generate_primes
+
+try:
+    import fcntl
+except ImportError:  # Windows: lock with msvcrt instead.
+    fcntl = None
+    import msvcrt
+
+POOL_MAGIC = b"RPIX"
+DEFAULT_POOL_DIR = "prime_pool"
+LOW_WATER = 8    # Start a refill when fewer primes than this are left.
+HIGH_WATER = 32  # A refill stops once this many primes are available.
+REFILL_BATCH = 4  # Primes generated between index updates during a refill.
+
+_INDEX = struct.Struct(">4sHQQ")
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _open_private(path):
+    """Open (creating if needed) a pool file for reading and writing, readable by its owner only."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, 0o600)  # Files created by older versions were world-readable.
+    return os.fdopen(fd, "r+b")
+
+
+def _record_size(bits):
+    return (bits + 7) // 8
+
+
+def _refill_worker(directory, bits, target, tester, algo):
+    PrimePool(directory, tester=tester, algo=algo).fill(bits, target)
+
+
+class PrimePool:
+    """
+    On-disk store of verified primes, partitioned by bit length.
+
+    take() hands out stored primes atomically. Whenever fewer than low_water
+    primes of a length are left, a background process tops that length up to
+    high_water; generating primes is CPU-bound, so this keeps the refill off
+    the caller's process entirely.
+
+    Lengths below SCARCE_PRIME_BITS are not pooled: there are too few such
+    primes to hand out distinct ones, so take() returns none and fill() and
+    refill() do nothing for them.
+    """
+
+    def __init__(self, directory=DEFAULT_POOL_DIR, tester=None, algo="miller-rabin",
+                 low_water=LOW_WATER, high_water=HIGH_WATER):
+        self.directory = directory
+        self.tester = tester or PrimalityTester()
+        self.algo = algo
+        self.low_water = low_water
+        self.high_water = high_water
+        self._refills = {}
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+
+    def _paths(self, bits):
+        base = os.path.join(self.directory, f"primes_{bits}")
+        return base + ".bin", base + ".idx"
+
+    def _open_index(self, bits):
+        """Open (creating if needed) and lock the index; returns (file, next, written)."""
+        _, index_path = self._paths(bits)
+        f = _open_private(index_path)
+        _lock(f)
+        f.seek(0)
+        raw = f.read(_INDEX.size)
+        if not raw:
+            return f, 0, 0
+        magic, stored_bits, position, written = _INDEX.unpack(raw)
+        if magic != POOL_MAGIC or stored_bits != bits:
+            _unlock(f)
+            f.close()
+            raise ValueError(f"{index_path} is not a prime pool index for {bits}-bit primes.")
+        return f, position, written
+
+    def _write_index(self, f, bits, position, written):
+        f.seek(0)
+        f.write(_INDEX.pack(POOL_MAGIC, bits, position, written))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def available(self, bits):
+        """Number of primes of this bit length that can still be taken."""
+        f, position, written = self._open_index(bits)
+        try:
+            return written - position
+        finally:
+            _unlock(f)
+            f.close()
+
+    def add(self, bits, primes):
+        """Append verified primes of the given bit length to the store."""
+        size = _record_size(bits)
+        data_path, _ = self._paths(bits)
+        f, position, written = self._open_index(bits)
+        try:
+            if position == written:
+                # Everything handed out: start the data file over instead of growing it.
+                position = written = 0
+            with _open_private(data_path) as data:
+                data.seek(written * size)
+                data.write(b"".join(p.to_bytes(size, "big") for p in primes))
+                data.truncate()
+                data.flush()
+                os.fsync(data.fileno())
+            self._write_index(f, bits, position, written + len(primes))
+        finally:
+            _unlock(f)
+            f.close()
+
+    def take(self, bits, count=1):
+        """
+        Remove and return up to `count` primes of the given bit length (fewer,
+        possibly none, if the store runs short). The taken records are zeroed
+        on disk before the index moves past them. Starts a background refill
+        when the store drops below the low-water mark.
+        """
+        if bits < SCARCE_PRIME_BITS:
+            return []
+        size = _record_size(bits)
+        data_path, _ = self._paths(bits)
+        f, position, written = self._open_index(bits)
+        try:
+            count = min(count, written - position)
+            primes = []
+            if count > 0:
+                with _open_private(data_path) as data:
+                    data.seek(position * size)
+                    raw = data.read(count * size)
+                    data.seek(position * size)
+                    data.write(bytes(len(raw)))
+                    data.flush()
+                    os.fsync(data.fileno())
+                primes = [int.from_bytes(raw[i:i + size], "big") for i in range(0, len(raw), size)]
+                self._write_index(f, bits, position + len(primes), written)
+            left = written - position - len(primes)
+        finally:
+            _unlock(f)
+            f.close()
+        if left < self.low_water:
+            self.refill(bits)
+        return primes
+
+    def fill(self, bits, target=None):
+        """Generate primes in this process until `target` (default high_water) are available."""
+        if bits < SCARCE_PRIME_BITS:
+            return
+        target = self.high_water if target is None else target
+        while True:
+            missing = target - self.available(bits)
+            if missing <= 0:
+                return
+            self.add(bits, generate_primes(bits, self.tester, min(missing, REFILL_BATCH), algo=self.algo))
+
+    def refill(self, bits):
+        """Top the store for this bit length up to high_water in a background process."""
+        if bits < SCARCE_PRIME_BITS:
+            return
+        process = self._refills.get(bits)
+        if process is not None and process.is_alive():
+            return
+        process = multiprocessing.Process(target=_refill_worker, daemon=True,
+                                          args=(self.directory, bits, self.high_water, self.tester, self.algo))
+        process.start()
+        self._refills[bits] = process
+
+    def stop(self):
+        """Terminate running refills; primes already stored are kept."""
+        for process in self._refills.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self._refills.clear()
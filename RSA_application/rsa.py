@@ -1,6 +1,21 @@
 import random
+import itertools
 import math
+import multiprocessing
+import os
+import queue
+import time
+from backend import invert, powmod
+from key_context import KeyContext
 from primality import PrimalityTester
+from sieve import CandidateSieve, primes_up_to
+
+PROGRESS_EVERY = 64  # Candidates tested between progress reports and cancellation checks.
+SCARCE_PRIME_BITS = 16  # Below this many bits, count the primes a search can return before relying on them.
+KEYGEN_ERROR_BOUND = 2 ** -128  # Probability the applications accept of a composite p or q.
+
+class Cancelled(Exception):
+    """Raised by a long-running operation whose cancel event was set."""
 
 def generate_prime_candidate(length):
     """Generate an odd integer candidate with the given bit length."""
@@ -8,66 +23,298 @@ def generate_prime_candidate(length):
     candidate |= (1 << (length - 1)) | 1  # Ensure MSB and LSB are set.
     return candidate
 
-def generate_prime(length, tester, algo="miller-rabin"):
-    """Generate a prime number of the given bit length using Miller-Rabin test."""
-    while True:
-        candidate = generate_prime_candidate(length)
-        if algo == "sqrt":
-            if tester.is_prime_sqrt(candidate):
-                return candidate
-        elif algo == "miller-rabin":
-            if tester.is_prime_miller_rabin(candidate):
-                return candidate
-        elif algo == "aks":
-            if tester.is_prime_aks(candidate):
-                return candidate
-        else:
-            raise ValueError("Unknown algorithm specified.")
+def _primality_check(tester, algo):
+    """Return the tester method implementing the named algorithm."""
+    if algo == "sqrt":
+        return tester.is_prime_sqrt
+    if algo == "miller-rabin":
+        return tester.is_prime_miller_rabin
+    if algo == "aks":
+        return tester.is_prime_aks
+    if algo == "bpsw":
+        return tester.is_prime_bpsw
+    raise ValueError("Unknown algorithm specified.")
+
+def generate_prime(length, tester, algo="miller-rabin", cancel=None, on_progress=None):
+    """
+    Generate a prime number of the given bit length.
+    Candidates come from an incremental sieve so that only numbers free of
+    small factors reach the (expensive) primality test.
+    Every PROGRESS_EVERY candidates, on_progress(tested) is called and the
+    search raises Cancelled if the `cancel` event is set.
+    """
+    is_prime = _primality_check(tester, algo)
+    for tested, candidate in enumerate(CandidateSieve(length), 1):
+        if is_prime(candidate):
+            if on_progress:
+                on_progress(tested)
+            return candidate
+        if tested % PROGRESS_EVERY == 0:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled("Prime search cancelled.")
+            if on_progress:
+                on_progress(tested)
+
+def generate_primes(length, tester, count, algo="miller-rabin", cancel=None, on_progress=None):
+    """
+    Generate `count` distinct primes of the given bit length, one
+    generate_prime search after another (cancel and on_progress as there).
+    Raises ValueError when fewer than `count` such primes exist.
+    """
+    if count > searchable_primes(length):
+        raise ValueError(f"There are fewer than {count} distinct {length}-bit primes.")
+    primes = []
+    while len(primes) < count:
+        prime = generate_prime(length, tester, algo=algo, cancel=cancel, on_progress=on_progress)
+        if prime not in primes:
+            primes.append(prime)
+    return primes
+
+def _prime_search_worker(length, tester, algo, stop_event, results, tested):
+    """Worker process: report every prime found until asked to stop."""
+    random.seed()  # Forked workers would otherwise share the parent's random state.
+    is_prime = _primality_check(tester, algo)
+    for count, candidate in enumerate(CandidateSieve(length), 1):
+        if stop_event.is_set():
+            return
+        if is_prime(candidate):
+            results.put(candidate)
+        if count % PROGRESS_EVERY == 0:
+            with tested.get_lock():
+                tested.value += PROGRESS_EVERY
+
+def generate_primes_parallel(length, tester, count=2, algo="miller-rabin", workers=None,
+                             cancel=None, on_progress=None):
+    """
+    Find `count` distinct primes of the given bit length with `workers` processes
+    racing on independent random searches. As soon as enough primes have been
+    reported the remaining workers are cancelled.
+    While waiting, on_progress(tested) receives the approximate number of
+    candidates tested by all workers, and setting `cancel` stops the search
+    with Cancelled.
+    """
+    workers = workers or os.cpu_count() or 1
+    _primality_check(tester, algo)  # Fail fast on an unknown algorithm.
+    ctx = multiprocessing.get_context()
+    stop_event = ctx.Event()
+    results = ctx.Queue()
+    tested = ctx.Value("q", 0)
+    procs = [
+        ctx.Process(target=_prime_search_worker,
+                    args=(length, tester, algo, stop_event, results, tested), daemon=True)
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    primes = []
+    try:
+        while len(primes) < count:
+            if cancel is not None and cancel.is_set():
+                raise Cancelled("Prime search cancelled.")
+            if on_progress:
+                on_progress(tested.value)
+            try:
+                prime = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in procs):
+                    raise RuntimeError("All prime search workers exited unexpectedly.")
+                continue
+            if prime not in primes:
+                primes.append(prime)
+    finally:
+        stop_event.set()
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
+        results.close()
+    return primes
 
-def egcd(a, b):
-    """Extended Euclidean Algorithm."""
-    if a == 0:
-        return (b, 0, 1)
-    g, y, x = egcd(b % a, a)
-    return (g, x - (b // a) * y, y)
+def searchable_primes(length):
+    """How many distinct primes a search for `length`-bit primes can return (odd, top bit set)."""
+    if length < 2:
+        return 0
+    if length >= SCARCE_PRIME_BITS:
+        return math.inf
+    return sum(1 for p in primes_up_to((1 << length) - 1) if p >= 1 << (length - 1) and p % 2)
 
 def modinv(a, m):
     """Modular inverse of a modulo m."""
-    g, x, _ = egcd(a, m)
-    if g != 1:
-        raise Exception("Modular inverse does not exist")
-    return x % m
+    return invert(a, m)
 
 class RSAKeyGenerator:
-    def __init__(self, bit_length=16, test_rounds=10, algo="miller-rabin"):
-        """Initialize the RSA key generator with the given bit length and test rounds."""
+    def __init__(self, bit_length=16, test_rounds=10, algo="miller-rabin", workers=1, error_bound=None, primes=2,
+                 pool=None):
+        """
+        Initialize the RSA key generator with the given bit length and test rounds.
+        With error_bound set, the Miller-Rabin round count is derived from it instead.
+        With workers > 1 the searches for p and q run concurrently, spread over
+        that many worker processes.
+        The modulus has at most 2 * bit_length bits; with primes=k > 2 it is the
+        product of k smaller primes sharing those bits (multi-prime RSA).
+        Raises ValueError when the bits are too few for k distinct primes.
+        With a PrimePool given as pool, primes are drawn from it first and only
+        searched for when it has run dry.
+        """
+        if primes < 2:
+            raise ValueError("RSA needs at least two primes.")
         self.bit_length = bit_length
-        self.tester = PrimalityTester(test_rounds=test_rounds)
+        self.tester = PrimalityTester(test_rounds=test_rounds, error_bound=error_bound)
         self.public_key = None
         self.private_key = None
         self.algo = algo
+        self.workers = workers
+        self.primes = primes
+        self.pool = pool
+        self.keys_per_second = None
+        lengths = self.prime_lengths()
+        for length in set(lengths):
+            if searchable_primes(length) < lengths.count(length):
+                raise ValueError(f"bit_length={bit_length} is too small for {primes} distinct primes.")
 
-    def generate_keys(self):
-        """Generate RSA keys using two primes produced by Miller-Rabin."""
-        p = generate_prime(self.bit_length, self.tester, algo=self.algo)
-        q = generate_prime(self.bit_length, self.tester, algo=self.algo)
-        n = p * q
-        phi = (p - 1) * (q - 1)
+    def prime_lengths(self):
+        """Bit lengths of the primes making up the modulus."""
+        total, k = 2 * self.bit_length, self.primes
+        return [total // k + (1 if i < total % k else 0) for i in range(k)]
+
+    def generate_keys(self, cancel=None, on_progress=None):
+        """
+        Generate RSA keys using primes produced by the configured primality test.
+        on_progress(tested) receives the running total of candidates tested, and
+        setting the `cancel` event aborts the search with Cancelled.
+        """
+        lengths = self.prime_lengths()
+        tested = [0, 0]  # Candidates tested by the finished searches and by the current one.
+
+        def report(count):
+            tested[1] = count
+            if on_progress:
+                on_progress(tested[0] + count)
+
+        def search_done():
+            tested[0] += tested[1]
+            tested[1] = 0
+
+        pooled = []
+        if self.pool is not None:
+            for length in sorted(set(lengths)):
+                pooled += self.pool.take(length, lengths.count(length))
+            if len(pooled) == len(lengths) and len(set(pooled)) == len(pooled):
+                return self.keys_from_primes(*pooled)
+        parallel = self.workers and self.workers > 1
+        if parallel and len(set(lengths)) == 1 and not pooled:
+            primes = generate_primes_parallel(lengths[0], self.tester, count=len(lengths), algo=self.algo,
+                                              workers=self.workers, cancel=cancel, on_progress=report)
+            return self.keys_from_primes(*primes)
+        primes = []
+        for length in lengths:
+            prime = next((p for p in pooled if p.bit_length() == length and p not in primes), None)
+            if prime is not None:
+                primes.append(prime)
+                continue
+            while prime is None or prime in primes:
+                if parallel:
+                    prime = generate_primes_parallel(length, self.tester, count=1, algo=self.algo,
+                                                     workers=self.workers, cancel=cancel,
+                                                     on_progress=report)[0]
+                else:
+                    prime = generate_prime(length, self.tester, algo=self.algo, cancel=cancel,
+                                           on_progress=report)
+                search_done()
+            primes.append(prime)
+        return self.keys_from_primes(*primes)
+
+    def generate_many(self, count, workers=None, on_progress=None):
+        """
+        Generate `count` key pairs on a pool of worker processes and yield each
+        (public_key, private_key) pair as soon as it completes.
+        Throughput is kept up to date in self.keys_per_second and, if given,
+        on_progress(done, count, keys_per_second) is called after every pair.
+        Closing the generator early (or interrupting it) terminates the pool.
+        """
+        workers = workers or os.cpu_count() or 1
+        _primality_check(self.tester, self.algo)  # Fail fast on an unknown algorithm.
+        task = (self.bit_length, self.tester, self.algo, self.primes)
+        pool = multiprocessing.Pool(processes=workers, initializer=random.seed)
+        start = time.perf_counter()
+        done = 0
+        completed = False
+        try:
+            for keys in pool.imap_unordered(_generate_key_pair, itertools.repeat(task, count)):
+                done += 1
+                elapsed = time.perf_counter() - start
+                self.keys_per_second = done / elapsed if elapsed > 0 else float("inf")
+                if on_progress:
+                    on_progress(done, count, self.keys_per_second)
+                yield keys
+            completed = True
+        finally:
+            if completed:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+
+    def keys_from_primes(self, *primes):
+        """
+        Build the RSA key pair for the given distinct primes.
+        The private key is (d, n, p, q, dp, dq, qinv) with p > q, followed for
+        multi-prime keys by a tuple of (r, d mod (r - 1), t) triples, where t is
+        the inverse of the product of all preceding primes modulo r.
+        """
+        n = math.prod(primes)
+        phi = math.prod(p - 1 for p in primes)
         e = 65537  # Common public exponent
         if math.gcd(e, phi) != 1:
             e = 3
         d = modinv(e, phi)
+        # Extended private key: the CRT parameters make decryption ~3-4x faster.
+        p, q = max(primes[:2]), min(primes[:2])
+        dp, dq, qinv = d % (p - 1), d % (q - 1), modinv(q, p)
         self.public_key = (e, n)
-        self.private_key = (d, n)
+        self.private_key = (d, n, p, q, dp, dq, qinv)
+        if len(primes) > 2:
+            others = []
+            product = p * q
+            for r in primes[2:]:
+                others.append((r, d % (r - 1), modinv(product, r)))
+                product *= r
+            self.private_key += (tuple(others),)
         return self.public_key, self.private_key
 
+def _generate_key_pair(task):
+    """Worker task for generate_many: build one key pair from scratch."""
+    bit_length, tester, algo, primes = task
+    generator = RSAKeyGenerator(bit_length=bit_length, algo=algo, primes=primes)
+    generator.tester = tester
+    return generator.generate_keys()
+
 def encrypt_block(m, public_key):
     e, n = public_key
-    return pow(m, e, n)
+    return powmod(m, e, n)
 
 def decrypt_block(c, private_key):
-    d, n = private_key
-    return pow(c, d, n)
+    """
+    Decrypt one block. Extended keys (d, n, p, q, dp, dq, qinv[, others]) use
+    the Chinese remainder theorem with Garner's recombination, one small modexp
+    per prime; plain (d, n) keys use one full-size modexp.
+    The parameters are read from the key's KeyContext (built here for a plain tuple).
+    """
+    key = KeyContext(private_key)
+    if key.p is None:
+        return powmod(c, key.exponent, key.n)
+    p, q = key.p, key.q
+    m1 = powmod(c % p, key.dp, p)
+    m2 = powmod(c % q, key.dq, q)
+    h = key.qinv * (m1 - m2) % p
+    m = m2 + h * q
+    if key.others:
+        product = p * q
+        for r, dr, t in key.others:
+            mr = powmod(c % r, dr, r)
+            m += product * ((mr - m) * t % r)
+            product *= r
+    return m
 
 def bytes_to_int(b):
     return int.from_bytes(b, byteorder='big')
@@ -80,26 +327,30 @@ def encrypt_data(data, public_key):
     Encrypt data (bytes) using RSA.
     Splits data into chunks so that each integer representation is less than n.
     """
-    e, n = public_key
-    max_chunk_size = (n.bit_length() - 1) // 8
-    chunks = [data[i:i+max_chunk_size] for i in range(0, len(data), max_chunk_size)]
-    encrypted_chunks = []
-    for chunk in chunks:
-        m = bytes_to_int(chunk)
-        c = encrypt_block(m, public_key)
-        encrypted_chunks.append(c)
-    return encrypted_chunks
-
-def decrypt_data(encrypted_chunks, private_key):
+    public_key = KeyContext(public_key)
+    max_chunk_size = public_key.chunk_size
+    view = memoryview(data)
+    return [encrypt_block(bytes_to_int(view[i:i+max_chunk_size]), public_key)
+            for i in range(0, len(view), max_chunk_size)]
+
+def decrypt_data(encrypted_chunks, private_key, length=None):
     """
     Decrypt a list of RSA encrypted integer chunks.
-    Returns the recovered bytes.
+    Returns the recovered bytes. When the original length is known, every chunk
+    is restored to its exact width (all but the last are max_chunk_size bytes),
+    so leading zero bytes survive; otherwise they are stripped from each chunk.
     """
-    d, n = private_key
-    max_chunk_size = (n.bit_length() - 1) // 8
-    decrypted_bytes = b""
+    private_key = KeyContext(private_key)
+    max_chunk_size = private_key.chunk_size
+    pieces = []
+    remaining = length
     for c in encrypted_chunks:
         m = decrypt_block(c, private_key)
-        chunk = int_to_bytes(m, max_chunk_size)
-        decrypted_bytes += chunk.lstrip(b'\x00')
-    return decrypted_bytes
+        if length is None:
+            chunk = int_to_bytes(m, max_chunk_size)
+            pieces.append(chunk.lstrip(b'\x00'))
+        else:
+            width = min(max_chunk_size, remaining)
+            pieces.append(int_to_bytes(m, width))
+            remaining -= width
+    return b"".join(pieces)
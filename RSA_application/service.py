@@ -0,0 +1,403 @@
+"""
+Long-running local encryption service.
+
+    python service.py --port 8765             # HTTP on 127.0.0.1:8765
+    python service.py --unix /tmp/rsa.sock    # HTTP on a Unix socket
+
+Endpoints (HTTP/1.1, one request per connection):
+
+    GET  /health                          service status as JSON
+    POST /keys?bits=1024&primes=2         a new key pair as JSON
+    POST /encrypt?user=alice[&mode=blocks]   body: plaintext, response: .enc container
+    POST /encrypt?e=65537&n=<hex>            ... for a key that is not registered
+    POST /decrypt?key=alice.key              body: .enc container, response: plaintext
+
+An asyncio front end parses requests and streams bodies; the CPU work runs on
+one shared process pool, so concurrent requests use every core and nothing is
+paid for interpreter start-up per call. Keys are parsed once and cached.
+Private keys are only read from the key directory (--key-dir, default: the
+working directory), and a key that fails to load gets a generic error.
+Request bodies (Content-Length or chunked) are spooled to a temporary file as
+they arrive, which also lets envelope containers be authenticated before any
+plaintext is sent; responses are streamed as chunked bodies, throttled by how
+fast the client reads. Memory use per request stays bounded. At most `max_active` requests run at once and
+`max_queued` more wait; beyond that the service answers 503.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from backend import backend_report
+from container import MODE_BLOCKS, MODE_ENVELOPE, decrypt_stream, encrypt_stream
+from key_context import KeyCache
+from parallel_blocks import BlockPool
+from rsa import KEYGEN_ERROR_BOUND, RSAKeyGenerator
+from user_store import LEGACY_USERS_FILE, USERS_DB, UserStore
+
+DEFAULT_PORT = 8765
+MIN_KEY_BITS = 256             # Smallest prime bit length /keys will generate.
+MAX_KEY_BITS = 8192            # Largest prime bit length /keys will generate.
+MIN_PRIME_BITS = 128           # Multi-prime keys: fewest bits per prime.
+SPOOL_MEMORY = 16 << 20        # Request bytes held in memory before spooling to disk.
+IO_CHUNK = 1 << 16             # Bytes per socket read or response chunk.
+MAX_HEADER_BYTES = 16 << 10
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _generate_keys(bits, primes):
+    """Runs in a pool worker process."""
+    generator = RSAKeyGenerator(bit_length=bits, error_bound=KEYGEN_ERROR_BOUND, primes=primes)
+    return generator.generate_keys()
+
+
+def _jsonable(value):
+    return [_jsonable(v) for v in value] if isinstance(value, tuple) else value
+
+
+class _Body:
+    """Request body read from the socket, by Content-Length or chunked transfer coding."""
+
+    def __init__(self, reader, length, chunked):
+        self.reader = reader
+        self.remaining = length
+        self.chunked = chunked
+        self.chunk_left = 0
+        self.done = not chunked and not length
+
+    async def read(self, size):
+        if self.done:
+            return b""
+        if not self.chunked:
+            data = await self.reader.read(min(size, self.remaining))
+            if not data:
+                raise HTTPError(400, "Request body ended early.")
+            self.remaining -= len(data)
+            self.done = self.remaining == 0
+            return data
+        if self.chunk_left == 0:
+            line = await self.reader.readline()
+            try:
+                self.chunk_left = int(line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HTTPError(400, "Malformed chunked request body.") from None
+            if self.chunk_left == 0:
+                while (await self.reader.readline()).strip():  # Trailer headers.
+                    pass
+                self.done = True
+                return b""
+        data = await self.reader.readexactly(min(size, self.chunk_left))
+        self.chunk_left -= len(data)
+        if self.chunk_left == 0:
+            await self.reader.readline()  # CRLF after the chunk.
+        return data
+
+    async def discard(self):
+        """Read and drop the rest of the body, so the client can finish sending and see our reply."""
+        while await self.read(IO_CHUNK):
+            pass
+
+
+class _ChunkedResponse(io.RawIOBase):
+    """
+    Blocking writer that streams a chunked response body from a worker thread.
+    The status line and headers go out with the first write, so an error
+    raised before any output can still become a proper error response.
+    Each write waits for the socket to drain, which throttles the producer.
+    """
+
+    def __init__(self, writer, loop, content_type):
+        self.writer = writer
+        self.loop = loop
+        self.content_type = content_type
+        self.started = False
+
+    def writable(self):
+        return True
+
+    async def _send(self, data):
+        if not self.started:
+            self.started = True
+            self.writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {self.content_type}\r\n"
+                              "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n".encode())
+        if data:
+            self.writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        await self.writer.drain()
+
+    def write(self, data):
+        view = memoryview(data)
+        for offset in range(0, len(view), IO_CHUNK):
+            chunk = bytes(view[offset:offset + IO_CHUNK])
+            asyncio.run_coroutine_threadsafe(self._send(chunk), self.loop).result()
+        return len(view)
+
+    async def finish(self):
+        await self._send(b"")
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+class RSAService:
+    """
+    Request handling and shared state: one BlockPool for all CPU work, a
+    thread per running request to drive the blocking stream code, and
+    caches of public keys by user and private keys by key file.
+    """
+
+    def __init__(self, workers=None, max_active=None, max_queued=64, db=USERS_DB, key_dir="."):
+        self.blocks = BlockPool(workers)
+        self.workers = self.blocks.workers
+        self.max_active = max_active or self.workers
+        self.max_queued = max_queued
+        self.active = asyncio.Semaphore(self.max_active)
+        self.pending = 0
+        self.threads = ThreadPoolExecutor(max_workers=self.max_active)
+        self.users = UserStore(db, legacy_path=LEGACY_USERS_FILE)
+        self.keys = KeyCache()
+        self.key_dir = os.path.realpath(key_dir)
+        self.public_keys = {}  # User -> KeyContext, bounded like the key cache.
+
+    def close(self):
+        self.threads.shutdown(wait=False)
+        self.blocks.close()
+        self.users.close()
+
+    def public_key(self, query):
+        if "user" in query:
+            user = query["user"]
+            if user not in self.public_keys:
+                try:
+                    key = self.users.public_key(user)
+                except KeyError:
+                    raise HTTPError(404, f"Unknown user '{user}'.") from None
+                if len(self.public_keys) >= self.keys.maxsize:
+                    del self.public_keys[next(iter(self.public_keys))]
+                self.public_keys[user] = self.keys.get(key)
+            return self.public_keys[user]
+        try:
+            return self.keys.get((int(query["e"]), int(query["n"], 16)))
+        except (KeyError, ValueError):
+            raise HTTPError(400, "Give either user=<name> or e=<int>&n=<hex>.") from None
+
+    def private_key(self, query):
+        name = query.get("key")
+        if not name:
+            raise HTTPError(400, "Give key=<private key file in the key directory>.")
+        path = os.path.realpath(os.path.join(self.key_dir, name))
+        try:
+            inside = os.path.commonpath([self.key_dir, path]) == self.key_dir
+        except ValueError:  # Windows: a path on another drive.
+            inside = False
+        if not inside or not os.path.isfile(path):
+            raise HTTPError(404, "No such key file in the key directory.")
+        try:
+            return self.keys.from_file(path)
+        except (OSError, ValueError):
+            # The parser's message would quote the file's contents back to the client.
+            raise HTTPError(400, "Cannot load private key.") from None
+
+    async def handle(self, reader, writer):
+        body = None
+        try:
+            try:
+                method, target, headers = await self._read_head(reader)
+                body = self._body(reader, headers)
+                url = urlsplit(target)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                await self._dispatch(method, url.path, query, body, writer)
+            except HTTPError as e:
+                if body is not None:
+                    await body.discard()
+                await self._send_json(writer, e.status, {"error": str(e)})
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            except Exception as e:
+                await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        except (HTTPError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # The client went away or sent garbage while we tried to answer.
+        finally:
+            writer.close()
+
+    def _body(self, reader, headers):
+        chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.") from None
+        return _Body(reader, length, chunked)
+
+    async def _read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(400, "Request header too large.") from None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def _dispatch(self, method, path, query, body, writer):
+        routes = {"/health": ("GET", self._health), "/keys": ("POST", self._keys),
+                  "/encrypt": ("POST", self._encrypt), "/decrypt": ("POST", self._decrypt)}
+        if path not in routes:
+            raise HTTPError(404, f"No such endpoint {path}.")
+        allowed, handler = routes[path]
+        if method != allowed:
+            raise HTTPError(405, f"{path} expects {allowed}.")
+        if path == "/health":
+            return await handler(writer)
+        if self.pending >= self.max_active + self.max_queued:
+            raise HTTPError(503, "Too many requests queued; retry later.")
+        self.pending += 1
+        try:
+            async with self.active:
+                await handler(query, body, writer)
+        finally:
+            self.pending -= 1
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _health(self, writer):
+        await self._send_json(writer, 200, {"status": "ok", "backend": backend_report(), "workers": self.workers,
+                                            "active_limit": self.max_active, "pending": self.pending})
+
+    async def _keys(self, query, body, writer):
+        try:
+            bits = int(query.get("bits", 1024))
+            primes = int(query.get("primes", 2))
+        except ValueError:
+            raise HTTPError(400, "bits and primes must be integers.") from None
+        max_primes = 2 * bits // MIN_PRIME_BITS
+        if not MIN_KEY_BITS <= bits <= MAX_KEY_BITS or not 2 <= primes <= max_primes:
+            raise HTTPError(400, f"bits must be {MIN_KEY_BITS}..{MAX_KEY_BITS} and primes 2..2*bits/{MIN_PRIME_BITS}.")
+        result = self.blocks.pool.apply_async(_generate_keys, (bits, primes)) if self.blocks.pool else None
+        loop = asyncio.get_running_loop()
+        try:
+            if result is None:
+                public_key, private_key = await loop.run_in_executor(self.threads, _generate_keys, bits, primes)
+            else:
+                public_key, private_key = await loop.run_in_executor(self.threads, result.get)
+        except ValueError as e:
+            raise HTTPError(400, str(e)) from None
+        await self._send_json(writer, 200, {"public_key": _jsonable(public_key),
+                                            "private_key": _jsonable(private_key)})
+
+    async def _stream(self, writer, content_type, job):
+        """Run job(response) on a worker thread, streaming whatever it writes."""
+        loop = asyncio.get_running_loop()
+        response = _ChunkedResponse(writer, loop, content_type)
+        try:
+            await loop.run_in_executor(self.threads, job, response)
+        except Exception as e:
+            if response.started:
+                return  # Too late for a status code: dropping the connection marks the body incomplete.
+            if isinstance(e, (ValueError, OverflowError)):
+                raise HTTPError(400, str(e)) from None
+            raise
+        await response.finish()
+
+    async def _spool(self, body):
+        """
+        Receive the whole request body into a temporary file (in memory up to
+        SPOOL_MEMORY). Responding while the client is still sending would
+        deadlock clients that only read once their request is sent.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+        length = 0
+        while True:
+            data = await body.read(IO_CHUNK)
+            if not data:
+                break
+            spool.write(data)
+            length += len(data)
+        spool.seek(0)
+        return spool, length
+
+    async def _encrypt(self, query, body, writer):
+        public_key = self.public_key(query)
+        mode = MODE_BLOCKS if query.get("mode") == "blocks" else MODE_ENVELOPE
+        spool, length = await self._spool(body)
+        with spool:
+            await self._stream(writer, "application/octet-stream",
+                               lambda out: encrypt_stream(spool, out, public_key, mode, length=length,
+                                                          workers=self.blocks))
+
+    async def _decrypt(self, query, body, writer):
+        private_key = self.private_key(query)
+        spool, _ = await self._spool(body)
+        with spool:
+            await self._stream(writer, "application/octet-stream",
+                               lambda out: decrypt_stream(spool, out, private_key, workers=self.blocks))
+
+
+async def serve(service, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle, path=unix_path, limit=MAX_HEADER_BYTES)
+        where = unix_path
+    else:
+        server = await asyncio.start_server(service.handle, host, port, limit=MAX_HEADER_BYTES)
+        where = f"http://{host}:{port}"
+    print(f"Serving on {where} with {service.workers} workers ({backend_report()})", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local RSA key generation and encryption service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--db", default=USERS_DB, help="user database (default: %(default)s)")
+    parser.add_argument("--key-dir", default=".", help="directory /decrypt reads key files from (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--max-queued", type=int, default=64, help="requests allowed to wait (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    async def run():
+        main_task = asyncio.current_task()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, main_task.cancel)
+            except NotImplementedError:  # Windows: Ctrl+C still raises KeyboardInterrupt.
+                pass
+        service = RSAService(workers=args.workers, max_queued=args.max_queued, db=args.db, key_dir=args.key_dir)
+        try:
+            await serve(service, args.host, args.port, args.unix)
+        finally:
+            service.close()
+            if args.unix and os.path.exists(args.unix):
+                os.remove(args.unix)
+
+    try:
+        asyncio.run(run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
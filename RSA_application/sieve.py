@@ -0,0 +1,82 @@
+import random
+
+SIEVE_PRIME_LIMIT = 1 << 15   # Sieve with the ~3500 odd primes below this bound.
+SIEVE_WINDOW = 4096           # Number of odd candidates examined per window.
+
+
+def primes_up_to(limit):
+    """Return the list of primes <= limit using the sieve of Eratosthenes."""
+    if limit < 2:
+        return []
+    flags = bytearray([1]) * (limit + 1)
+    flags[0] = flags[1] = 0
+    for p in range(2, int(limit ** 0.5) + 1):
+        if flags[p]:
+            flags[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    return [i for i, is_p in enumerate(flags) if is_p]
+
+
+_SMALL_ODD_PRIMES = primes_up_to(SIEVE_PRIME_LIMIT)[1:]
+
+
+class CandidateSieve:
+    """
+    Incremental prime-candidate search over odd integers of a fixed bit length.
+
+    A single random odd start is picked and the residues of the current window
+    base modulo every small odd prime are kept in a table. Each window of
+    SIEVE_WINDOW odd numbers is sieved by striking out the multiples of every
+    small prime, then the residue table is advanced to the next window instead
+    of being recomputed. Only candidates with no small factor are yielded.
+    """
+
+    def __init__(self, length, window=SIEVE_WINDOW):
+        if length < 2:
+            raise ValueError("Bit length must be at least 2.")
+        self.length = length
+        self.window = window
+        self.low = 1 << (length - 1)
+        self.high = 1 << length
+        # A candidate >= 2^(length-1) divisible by p is composite only when p is
+        # smaller than the candidate, so tiny bit lengths use fewer primes.
+        self.primes = [p for p in _SMALL_ODD_PRIMES if p < self.low]
+        self._restart()
+
+    def _restart(self):
+        """Pick a new random odd start and rebuild the residue table."""
+        start = random.getrandbits(self.length)
+        start |= self.low | 1
+        self.base = start
+        self.residues = [start % p for p in self.primes]
+
+    def _advance(self):
+        """Move the window base forward and update the residue table."""
+        step = 2 * self.window
+        self.base += step
+        self.residues = [(r + step) % p for r, p in zip(self.residues, self.primes)]
+
+    def _sieve_window(self):
+        """Return a bytearray flagging the odd numbers in the current window free of small factors."""
+        window = self.window
+        flags = bytearray([1]) * window
+        for p, r in zip(self.primes, self.residues):
+            # Candidate base + 2i is divisible by p when 2i = -r (mod p).
+            offset = -r * ((p + 1) // 2) % p
+            if offset < window:
+                flags[offset::p] = bytes(len(range(offset, window, p)))
+        return flags
+
+    def __iter__(self):
+        while True:
+            flags = self._sieve_window()
+            base = self.base
+            for i in range(self.window):
+                if flags[i]:
+                    candidate = base + 2 * i
+                    if candidate >= self.high:
+                        break
+                    yield candidate
+            if base + 2 * self.window >= self.high:
+                self._restart()
+            else:
+                self._advance()
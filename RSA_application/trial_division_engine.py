@@ -0,0 +1,125 @@
+import bisect
+import math
+from sieve import primes_up_to
+
+try:
+    import numpy as np
+except ImportError:  # Fall back to the pure Python loops.
+    np = None
+
+INITIAL_TABLE_LIMIT = 1 << 16
+PRIME_TABLE_MAX = 1 << 22    # Past this bound the table stops growing and the wheel takes over.
+NUMPY_BLOCK = 1 << 16        # Divisors checked per vectorized remainder operation.
+UINT64_LIMIT = 1 << 64
+
+# Mod-210 wheel: only residues coprime to 2, 3, 5 and 7 can be prime divisors.
+WHEEL_MODULUS = 210
+WHEEL_RESIDUES = tuple(r for r in range(1, WHEEL_MODULUS) if math.gcd(r, WHEEL_MODULUS) == 1)
+
+
+class PrimeTable:
+    """Table of consecutive primes, extended lazily by a segmented sieve."""
+
+    def __init__(self, limit=INITIAL_TABLE_LIMIT):
+        self.limit = limit
+        self.primes = primes_up_to(limit)
+        self._array = None
+
+    def extend_to(self, bound):
+        """Make sure every prime <= bound (capped at PRIME_TABLE_MAX) is in the table."""
+        bound = min(bound, PRIME_TABLE_MAX)
+        if bound <= self.limit:
+            return
+        # Grow geometrically so repeated small extensions stay cheap.
+        new_limit = min(max(bound, 2 * self.limit), PRIME_TABLE_MAX)
+        low = self.limit + 1
+        flags = bytearray([1]) * (new_limit - low + 1)
+        for p in self.primes:
+            if p * p > new_limit:
+                break
+            start = max(p * p, -(-low // p) * p)
+            flags[start - low::p] = bytes(len(range(start - low, len(flags), p)))
+        self.primes.extend(low + i for i, is_p in enumerate(flags) if is_p)
+        self.limit = new_limit
+        self._array = None
+
+    def primes_up_to(self, bound):
+        """Primes <= bound from the table (the caller extends the table first)."""
+        return self.primes[:bisect.bisect_right(self.primes, bound)]
+
+    def as_array(self):
+        """The table as a NumPy uint64 array, rebuilt only after an extension."""
+        if self._array is None:
+            self._array = np.array(self.primes, dtype=np.uint64)
+        return self._array
+
+
+_table = PrimeTable()
+
+
+def _first_divisor(n, divisors):
+    """First entry of a uint64 array dividing n, or None."""
+    for start in range(0, len(divisors), NUMPY_BLOCK):
+        block = divisors[start:start + NUMPY_BLOCK]
+        hits = np.flatnonzero(np.uint64(n) % block == 0)
+        if hits.size:
+            return int(block[hits[0]])
+    return None
+
+
+def _table_factor(n, bound):
+    """Smallest prime factor of n that is <= bound, searching the prime table."""
+    _table.extend_to(bound)
+    if np is not None and n < UINT64_LIMIT:
+        divisors = _table.as_array()
+        return _first_divisor(n, divisors[:np.searchsorted(divisors, bound, side="right")])
+    for p in _table.primes_up_to(bound):
+        if n % p == 0:
+            return p
+    return None
+
+
+def _wheel_factor(n, start, bound):
+    """Smallest divisor of n in [start, bound] on the mod-210 wheel (start is a multiple of 210)."""
+    if np is not None and n < UINT64_LIMIT:
+        offsets = np.array(WHEEL_RESIDUES, dtype=np.uint64)
+        cycles_per_block = max(1, NUMPY_BLOCK // len(WHEEL_RESIDUES))
+        for base in range(start, bound + 1, WHEEL_MODULUS * cycles_per_block):
+            top = min(base + WHEEL_MODULUS * cycles_per_block, bound + 1)
+            cycles = np.arange(base, top, WHEEL_MODULUS, dtype=np.uint64)
+            divisors = (cycles[:, None] + offsets).ravel()
+            found = _first_divisor(n, divisors[divisors <= bound])
+            if found is not None:
+                return found
+        return None
+    for base in range(start, bound + 1, WHEEL_MODULUS):
+        for r in WHEEL_RESIDUES:
+            d = base + r
+            if d > bound:
+                return None
+            if n % d == 0:
+                return d
+    return None
+
+
+def smallest_factor(n, limit=None):
+    """
+    Smallest prime factor of n that is <= limit (default: isqrt(n)), or None.
+    Divisors come from the lazily extended prime table, then from the mod-210
+    wheel beyond PRIME_TABLE_MAX. When n fits in 64 bits the remainders are
+    computed in NumPy blocks.
+    """
+    bound = math.isqrt(n)
+    if limit is not None:
+        bound = min(bound, limit)
+    found = _table_factor(n, min(bound, PRIME_TABLE_MAX))
+    if found is not None or bound <= PRIME_TABLE_MAX:
+        return found
+    return _wheel_factor(n, PRIME_TABLE_MAX // WHEEL_MODULUS * WHEEL_MODULUS, bound)
+
+
+def is_prime(n):
+    """Deterministic primality by trial division up to isqrt(n)."""
+    if n < 2:
+        return False
+    return smallest_factor(n) is None
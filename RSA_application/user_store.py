@@ -0,0 +1,114 @@
+"""
+Registered users and their public keys, kept in an indexed SQLite database.
+
+Each user is one row keyed by username, so registering or removing a user
+touches a single row instead of rewriting the whole store, and listing or
+searching usernames never loads the keys. The modulus is stored as a
+big-endian blob since it does not fit SQLite's 64-bit integers.
+"""
+import json
+import os
+import sqlite3
+
+USERS_DB = "users.db"
+LEGACY_USERS_FILE = "users.json"  # Pre-database store, migrated into USERS_DB on first open.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    e INTEGER NOT NULL,
+    n BLOB NOT NULL
+)
+"""
+
+
+def _pack_int(value):
+    return value.to_bytes((value.bit_length() + 7) // 8 or 1, "big")
+
+
+class UserStore:
+    """
+    Mapping-like store of username -> public key (e, n).
+
+    A users.json file left by older versions is imported on first open and
+    renamed to users.json.migrated so it is not imported again.
+    """
+
+    def __init__(self, path=USERS_DB, legacy_path=LEGACY_USERS_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(_SCHEMA)
+        if legacy_path and os.path.exists(legacy_path):
+            self.migrate_json(legacy_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __contains__(self, username):
+        row = self.connection.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def __iter__(self):
+        """Usernames in sorted order, streamed from the index."""
+        for (username,) in self.connection.execute("SELECT username FROM users ORDER BY username"):
+            yield username
+
+    def add(self, username, public_key):
+        """Register a user; raises ValueError if the username is taken."""
+        e, n = public_key
+        try:
+            with self.connection:
+                self.connection.execute("INSERT INTO users (username, e, n) VALUES (?, ?, ?)",
+                                        (username, e, _pack_int(n)))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username '{username}' already exists.") from None
+
+    def remove(self, username):
+        """Delete a user; raises KeyError if there is no such user."""
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM users WHERE username = ?", (username,))
+        if cursor.rowcount == 0:
+            raise KeyError(username)
+
+    def public_key(self, username):
+        """The (e, n) public key of a user; raises KeyError if there is no such user."""
+        row = self.connection.execute("SELECT e, n FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return row[0], int.from_bytes(row[1], "big")
+
+    def search(self, prefix="", limit=None):
+        """Sorted usernames starting with prefix, as a range scan on the primary key."""
+        query = "SELECT username FROM users WHERE username >= ? AND username < ? ORDER BY username"
+        params = [prefix, prefix + "\U0010ffff"]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [username for (username,) in self.connection.execute(query, params)]
+
+    def first(self):
+        """The alphabetically first username, or None when the store is empty."""
+        row = self.connection.execute("SELECT MIN(username) FROM users").fetchone()
+        return row[0]
+
+    def migrate_json(self, json_path):
+        """Import users from a legacy users.json in one transaction, then rename the file."""
+        with open(json_path, "r") as f:
+            users = json.load(f)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO users (username, e, n) VALUES (?, ?, ?)",
+                ((username, int(e), _pack_int(int(n))) for username, (e, n) in users.items()))
+        os.replace(json_path, json_path + ".migrated")
+        return len(users)
@@ -1,55 +1,227 @@
+"""
+Time Miller-Rabin, AKS and trial division on primes of 1 to 300 digits.
+
+    python main.py run --jobs 4 --budget 10
+    python main.py plot primality_times.json
+
+Each (algorithm, prime) cell runs in its own worker process with a wall-clock
+budget; several cells run at once (--jobs). Inside the budget the worker
+calibrates how many calls make up one sample, then collects as many samples
+as fit. A cell that runs out of budget is stopped and recorded as a timeout,
+and larger primes for that algorithm are skipped; there are no fixed size
+cutoffs. Results are written to CSV and JSON, and the plot is drawn from the
+JSON without a display. Use --jobs 1 for the least noisy numbers.
+AKS spreads its congruence checks over cpu_count // jobs processes per cell
+(one process when every core already runs a cell), and that pool is started
+by the untimed first call, not inside the samples.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import statistics
+import sys
 import time
-import matplotlib.pyplot as plot
+from functools import partial
+from multiprocessing.connection import wait
 from data.primes2 import primes
+from src import rsa_application  # noqa: F401  (puts RSA_application, and backend, on sys.path)
 from src.trial_division import trial_division
 from src.miller_rabin import miller_rabin
 from src.aks import aks
+from backend import backend_report
+from benchmark_tools import format_result, isolate, kill, machine_metadata
+
+ALGORITHMS = {
+    "miller-rabin": miller_rabin,
+    "aks": aks,
+    "trial-division": trial_division,
+}
+LABELS = {"miller-rabin": "Rabin-Miller", "aks": "AKS", "trial-division": "Trial Division"}
+CELL_BUDGET = 10.0       # Wall-clock seconds per cell, including the worker's start-up.
+MEASURE_FRACTION = 0.5   # Share of the budget spent on timed samples.
+MIN_SAMPLE_TIME = 0.02   # Calls are batched until one sample takes at least this long.
+MIN_REPEATS = 3
+MAX_REPEATS = 25
+RESULTS_BASENAME = "primality_times"
+PLOT_FILE = "primality_testing_performance.png"
+CSV_FIELDS = ["algorithm", "digits", "bits", "status", "loops", "repeats", "median_s", "min_s", "max_s", "error"]
+
+
+def _time_calls(function, n, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        function(n)
+    return time.perf_counter() - start
+
+
+def aks_workers(jobs):
+    """Processes each AKS cell may use, so that `jobs` cells together do not oversubscribe the CPUs."""
+    return max(1, (os.cpu_count() or 1) // jobs)
+
+
+def _run_cell(algorithm, n, budget, conn, workers=1):
+    """
+    Worker process body: calibrate, then send per-call timings until
+    MAX_REPEATS samples are taken or the measuring share of the budget is used.
+    """
+    isolate()
+    try:
+        function = ALGORITHMS[algorithm]
+        if algorithm == "aks":
+            function = partial(aks, workers=workers)
+        started = time.perf_counter()
+        # Untimed check; it also starts AKS's process pool, which later calls reuse.
+        if not function(n):
+            raise RuntimeError(f"{algorithm} rejected the prime {n}.")
+        loops = 1
+        while True:
+            elapsed = _time_calls(function, n, loops)
+            if elapsed >= MIN_SAMPLE_TIME or loops >= 10 ** 6:
+                break
+            loops *= 10
+        conn.send(("calibrated", loops))
+        conn.send(("sample", elapsed / loops))  # The calibration run counts as the first sample.
+        stop_at = started + budget * MEASURE_FRACTION
+        for repeat in range(1, MAX_REPEATS):
+            # Stop early when another sample would overrun, once there are enough for a median.
+            if time.perf_counter() + elapsed > stop_at and repeat >= MIN_REPEATS:
+                break
+            elapsed = _time_calls(function, n, loops)
+            conn.send(("sample", elapsed / loops))
+        conn.send(("done", None))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _record(algorithm, prime, status, samples=(), loops=None, error=None):
+    record = {
+        "algorithm": algorithm,
+        "digits": len(str(prime)),
+        "bits": prime.bit_length(),
+        "status": status,
+        "loops": loops,
+        "repeats": len(samples),
+        "samples": list(samples),
+        "median_s": statistics.median(samples) if samples else None,
+        "min_s": min(samples) if samples else None,
+        "max_s": max(samples) if samples else None,
+        "error": error,
+    }
+    return record
+
+
+def run_cells(inputs, algorithms, jobs, budget):
+    """
+    Time every (algorithm, prime) cell, at most `jobs` worker processes at a time.
+    Cells start smallest prime first; once an algorithm times out, its cells
+    for larger primes are recorded as skipped instead of being started.
+    """
+    ctx = multiprocessing.get_context()
+    workers = aks_workers(jobs)
+    pending = [(index, algorithm) for index in range(len(inputs)) for algorithm in algorithms]
+    running = {}  # cell id -> [process, receiving end of its pipe, deadline, samples, loops]
+    records = {}
+    timed_out = {}  # algorithm -> smallest digit count that timed out
+
+    def finish(cell_id, status, error=None):
+        process, conn, _, samples, loops = running.pop(cell_id)
+        process.join(timeout=1.0 if status == "ok" else 0)
+        if process.is_alive():
+            kill(process)
+        conn.close()
+        index, algorithm = cell_id
+        if status == "timeout":
+            digits = len(str(inputs[index]))
+            timed_out[algorithm] = min(digits, timed_out.get(algorithm, digits))
+        records[cell_id] = _record(algorithm, inputs[index], status, samples, loops, error)
+        print(format_record(records[cell_id]), flush=True)
+        if status == "timeout":
+            for other in [c for c in running if c[1] == algorithm and c[0] > index]:
+                finish(other, "skipped", f"timed out at {timed_out[algorithm]} digits")
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            cell_id = pending.pop(0)
+            index, algorithm = cell_id
+            limit = timed_out.get(algorithm)
+            if limit is not None and len(str(inputs[index])) >= limit:
+                records[cell_id] = _record(algorithm, inputs[index], "skipped",
+                                           error=f"timed out at {limit} digits")
+                continue
+            # One pipe per cell: a worker killed mid-write cannot block the others.
+            receiver, sender = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_run_cell, args=(algorithm, inputs[index], budget, sender, workers))
+            process.start()
+            sender.close()
+            running[cell_id] = [process, receiver, time.monotonic() + budget, [], None]
+        by_conn = {entry[1]: cell_id for cell_id, entry in running.items()}
+        for conn in wait(list(by_conn), timeout=0.1):
+            cell_id = by_conn[conn]
+            if cell_id not in running:
+                continue  # Already stopped along with a timed-out smaller cell.
+            try:
+                kind, value = conn.recv()
+            except EOFError:
+                finish(cell_id, "error", f"worker exited with code {running[cell_id][0].exitcode}")
+                continue
+            if kind == "calibrated":
+                running[cell_id][4] = value
+            elif kind == "sample":
+                running[cell_id][3].append(value)
+            elif kind == "done":
+                finish(cell_id, "ok")
+            else:
+                finish(cell_id, "error", value)
+        now = time.monotonic()
+        for cell_id in [c for c, entry in running.items() if now > entry[2]]:
+            if cell_id in running:
+                finish(cell_id, "timeout")
+    return [records[(index, algorithm)] for index in range(len(inputs)) for algorithm in algorithms]
 
-def main():
-    miller_rabin_times = []
-    aks_times = []
-    trial_division_times = []
-
-    for prime in primes:
-        miller_rabin_times.append(get_execution_time(miller_rabin, prime))
-        aks_times.append(get_execution_time(aks, prime))
-
-        if len(str(prime)) <= 18:
-            trial_division_times.append(get_execution_time(trial_division, prime))
-        else:
-            trial_division_times.append(None)
-
-    print_and_plot_results(primes, miller_rabin_times, aks_times, trial_division_times)
-
-def get_execution_time(function, input):
-    start_time = time.perf_counter()
-    function(input)
-    end_time = time.perf_counter()
-    return end_time - start_time
-
-def print_and_plot_results(primes, time_rabin_miller, time_aks, time_trial_division):
-    digit_lengths = [len(str(p)) for p in primes]
-
-    print('{:<10s} {:<12s} {:<10s} {:<15s}'.format(
-        'Digits',
-        'Miller-Rabin',
-        'AKS',
-        'Trial Division'
-    ))
-
-    for index, _ in enumerate(primes):
-        print('{:<10d} {:<12.12f} {:<10.12f} {:<15.12f}'.format(
-            digit_lengths[index],
-            time_rabin_miller[index],
-            time_aks[index],
-            time_trial_division[index] if time_trial_division[index]
-            else float('inf')
-        ))
 
+def format_record(record):
+    measured = None
+    if record["median_s"] is not None:
+        measured = (f"median {record['median_s']:.3e} s  min {record['min_s']:.3e} s  "
+                    f"({record['repeats']} x {record['loops']})")
+    return format_result(f"{record['digits']:>4} digits  {record['algorithm']:<15} ", record["status"],
+                         record["error"], measured)
+
+
+def write_results(records, meta, basename):
+    """Write basename.json (metadata and raw samples) and basename.csv (one row per cell)."""
+    with open(basename + ".json", "w") as f:
+        json.dump({"metadata": meta, "results": records}, f, indent=2)
+    with open(basename + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(records)
+    return basename + ".json", basename + ".csv"
+
+
+def plot_results(json_path, png_path=PLOT_FILE):
+    """Draw the median time per algorithm against digits from a saved JSON file, without a display."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plot
+
+    with open(json_path) as f:
+        report = json.load(f)
+    meta = report["metadata"]
     plot.figure(figsize=(10, 6))
-    plot.plot(digit_lengths, time_rabin_miller, label='Rabin-Miller')
-    plot.plot(digit_lengths, time_aks, label='AKS')
-    plot.plot(digit_lengths, time_trial_division, label='Trial Division')
+    caption = []
+    for algorithm in ALGORITHMS:
+        rows = [r for r in report["results"] if r["algorithm"] == algorithm]
+        if not rows:
+            continue
+        measured = [r for r in rows if r["status"] == "ok"]
+        plot.plot([r["digits"] for r in measured], [r["median_s"] for r in measured], label=LABELS[algorithm])
+        stopped = [r["digits"] for r in rows if r["status"] != "ok"]
+        if stopped:
+            caption.append(f"{LABELS[algorithm]} exceeded the {meta['budget_s']:g} s budget "
+                           f"from {min(stopped)} digits")
     plot.xlabel('Digits')
     plot.ylabel('Logarithmic Execution Time (s)')
     plot.yscale('log')
@@ -58,11 +230,10 @@ def print_and_plot_results(primes, time_rabin_miller, time_aks, time_trial_divis
     plot.figtext(
         0.5,
         0.01,
-        'Figure: Execution time comparison for Miller-Rabin, AKS, and Trial Division primality ' +
-        'tests across different number sizes (in digits). Logarithmic scale used on the y-axis for clearer ' +
-        'visualization of time differences due to large disparity in execution times. Miller-Rabin, ' +
-        'and AKS tests show moderate time increases with number size, while Trial Division shows a more ' +
-        'dramatic time increase, becoming unfeasible after 18 digits.',
+        'Figure: Median execution time per call for Miller-Rabin, AKS, and Trial Division primality tests '
+        'across different number sizes (in digits), on a logarithmic y-axis. '
+        + ("; ".join(caption) + ". " if caption else "")
+        + f"{meta['python']}, {meta['backend']}.",
         fontsize=10,
         ha='center',
         va='bottom',
@@ -70,8 +241,55 @@ def print_and_plot_results(primes, time_rabin_miller, time_aks, time_trial_divis
         bbox={"facecolor": "lightgrey", "alpha": 0.7, "pad": 5}
     )
     plot.subplots_adjust(bottom=0.2)
-    plot.savefig('primality_testing_performance.png', dpi=300)
-    plot.show()
+    plot.savefig(png_path, dpi=300)
+    plot.close()
+    return png_path
+
+
+def cmd_run(args):
+    print(backend_report())
+    inputs = [p for p in primes if len(str(p)) <= args.max_digits]
+    records = run_cells(inputs, args.algorithms, args.jobs, args.budget)
+    meta = machine_metadata(jobs=args.jobs, budget_s=args.budget, aks_workers=aks_workers(args.jobs))
+    json_path, csv_path = write_results(records, meta, args.output)
+    print(f"Results saved to {json_path} and {csv_path}")
+    if not args.no_plot:
+        print(f"Plot saved to {plot_results(json_path, args.plot)}")
+    return 1 if any(r["status"] == "error" for r in records) else 0
+
+
+def cmd_plot(args):
+    print(f"Plot saved to {plot_results(args.results, args.plot)}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Compare primality test running times.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="time every algorithm on every prime")
+    p.add_argument("--algorithms", nargs="+", choices=list(ALGORITHMS), default=list(ALGORITHMS))
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                   help="cells timed at once (default: %(default)s)")
+    p.add_argument("--budget", type=float, default=CELL_BUDGET,
+                   help="wall-clock seconds per cell (default: %(default)s)")
+    p.add_argument("--max-digits", type=int, default=300, help="largest prime to time, in digits")
+    p.add_argument("--output", default=RESULTS_BASENAME, help="results file name without extension")
+    p.add_argument("--plot", default=PLOT_FILE)
+    p.add_argument("--no-plot", action="store_true")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("plot", help="draw the plot from a saved JSON results file")
+    p.add_argument("results")
+    p.add_argument("--plot", default=PLOT_FILE)
+    p.set_defaults(func=cmd_plot)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""Make the engines in RSA_application importable from the benchmark sources."""
+import os
+import sys
+
+RSA_APPLICATION_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "RSA_application")
+)
+
+if RSA_APPLICATION_DIR not in sys.path:
+    sys.path.append(RSA_APPLICATION_DIR)
@@ -1,13 +1,6 @@
-import math
+from src import rsa_application  # noqa: F401  (puts the shared engines on sys.path)
+from trial_division_engine import is_prime
 
 
 def trial_division(n):
-    if n <= 1 or n % 2 == 0:
-        return False
-
-    if n == 2 or n == 3:
-        return True
-
-    for i in range(2, int(math.sqrt(n)) + 1):
-        if n % i == 0:
-            return False
\ No newline at end of file
+    return is_prime(n)